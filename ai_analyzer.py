@@ -1,43 +1,31 @@
 import pandas as pd
-import numpy as np
-import re
-from textblob import TextBlob
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.decomposition import LatentDirichletAllocation
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
-class AIAnalyzer:
-    def __init__(self, max_features: int = 2000):
-        self.vectorizer = TfidfVectorizer(max_features=max_features, stop_words="english", ngram_range=(1, 2))
-
-    def _filter_text_df(self, df: pd.DataFrame) -> pd.DataFrame:
-        if df is None or df.empty or "message" not in df.columns:
-            return pd.DataFrame(columns=["message", "only_date"])
-        mask = ~df["message"].str.contains(r"<|omitted|deleted", case=False, na=False)
-        return df.loc[mask, ["message", "only_date"]].copy()
+from frame_cache import user_frame, user_rows
+from profiling import profiled
+from response_times import SESSION_GAP_MINUTES, response_times
+from sentiment import message_sentiment
+from topics import chat_topics
 
+class AIAnalyzer:
+    @profiled()
     def analyze_sentiment(self, df: pd.DataFrame, selected_user: str = "Overall") -> pd.DataFrame:
         if df is None or df.empty:
             return pd.DataFrame(columns=["date", "avg_sentiment", "message_count"])
+        # Scores are memoized per chat frame, computed once per distinct text [6][7]
+        sentiment = message_sentiment(df)
         if selected_user != "Overall":
-            df = df[df["user"] == selected_user]
-        text_df = self._filter_text_df(df)
-        if text_df.empty:
+            rows = user_rows(df).get(selected_user, [])
+            df, sentiment = df.iloc[rows], sentiment.iloc[rows]
+        scored = sentiment.notna()
+        if not scored.any():
             return pd.DataFrame(columns=["date", "avg_sentiment", "message_count"])
-        scores, dates = [], []
-        for _, row in text_df.iterrows():
-            msg = str(row["message"])
-            try:
-                s = TextBlob(msg).sentiment.polarity  # [-1, 1] [6][7]
-            except Exception:
-                s = 0.0
-            scores.append(s); dates.append(row["only_date"])
-        sdf = pd.DataFrame({"date": dates, "sentiment": scores})
-        daily = sdf.groupby("date")["sentiment"].agg(["mean", "count"]).reset_index()
+        daily = sentiment[scored].groupby(df["only_date"][scored]).agg(["mean", "count"]).reset_index()
         daily.columns = ["date", "avg_sentiment", "message_count"]
         return daily
 
+    @profiled()
     def generate_sentiment_chart(self, sentiment_df: pd.DataFrame):
         if sentiment_df is None or sentiment_df.empty:
             return None
@@ -58,34 +46,19 @@ class AIAnalyzer:
         fig.update_yaxes(title_text="Message Count", row=2, col=1)
         return fig
 
+    @profiled()
     def extract_topics(self, df: pd.DataFrame, selected_user: str = "Overall", n_topics: int = 5):
         if df is None or df.empty:
             return None, None
-        if selected_user != "Overall":
-            df = df[df["user"] == selected_user]
-        text_df = self._filter_text_df(df)
-        texts = []
-        for msg in text_df["message"]:
-            t = re.sub(r"[^\w\s]", " ", str(msg).lower())
-            t = re.sub(r"\s+", " ", t).strip()
-            if len(t) > 10:
-                texts.append(t)
-        if len(texts) < 10:
-            return None, None
+        # One online LDA model per chat; users get the rows of its matrix
+        model = chat_topics(df)
+        rows = None if selected_user == "Overall" else user_rows(df).get(selected_user, [])
         try:
-            X = self.vectorizer.fit_transform(texts)
-            n_comp = max(1, min(n_topics, X.shape))
-            lda = LatentDirichletAllocation(n_components=n_comp, random_state=42, max_iter=50)
-            dist = lda.fit_transform(X)
-            vocab = self.vectorizer.get_feature_names_out()
-            topics = []
-            for comp in lda.components_:
-                idx = comp.argsort()[-10:][::-1]
-                topics.append([vocab[i] for i in idx])
-            return topics, dist
+            return model.topics(rows, n_topics=n_topics)
         except Exception:
             return None, None
 
+    @profiled()
     def generate_topic_chart(self, topics):
         if not topics:
             return None
@@ -100,43 +73,46 @@ class AIAnalyzer:
         fig.update_layout(title="AI-Discovered Conversation Topics", height=400, showlegend=False)
         return fig
 
-    def analyze_communication_patterns(self, df: pd.DataFrame, selected_user: str = "Overall") -> dict:
+    @profiled()
+    def analyze_communication_patterns(self, df: pd.DataFrame, selected_user: str = "Overall",
+                                       session_gap_minutes: int = SESSION_GAP_MINUTES) -> dict:
         out = {}
         if df is None or df.empty:
             return out
-        if selected_user != "Overall":
-            df = df[df["user"] == selected_user]
         if "date" in df.columns:
-            df_sorted = df.sort_values("date")
-            rtimes = []
-            for i in range(1, len(df_sorted)):
-                if df_sorted.iloc[i]["user"] != df_sorted.iloc[i-1]["user"]:
-                    diff = df_sorted.iloc[i]["date"] - df_sorted.iloc[i-1]["date"]
-                    rtimes.append(diff.total_seconds()/60.0)
-            if rtimes:
-                out["avg_response_time"] = float(np.mean(rtimes))
-                out["response_time_std"] = float(np.std(rtimes))
+            # Replies are measured within the whole chat, then filtered to the responder
+            rt = response_times(df, session_gap_minutes)
+            out.update(rt.stats(selected_user))
+            matrix = rt.latency_matrix(selected_user)
+            if not matrix.empty:
+                out["response_latency_matrix"] = matrix
+            out.update(rt.session_stats(selected_user))
+        df = user_frame(df, selected_user)
         mask = ~df["message"].str.contains(r"<|omitted|deleted", case=False, na=False)
-        lens = [len(str(m)) for m in df.loc[mask, "message"]]
-        if lens:
-            out["avg_message_length"] = float(np.mean(lens))
-            out["message_length_std"] = float(np.std(lens))
+        lens = df.loc[mask, "message"].astype(str).str.len()
+        if not lens.empty:
+            out["avg_message_length"] = float(lens.mean())
+            out["message_length_std"] = float(lens.std(ddof=0))
         if "hour" in df.columns:
-            h = df.groupby("hour").size()
+            h = df.groupby("hour", observed=True).size()
             if not h.empty:
                 out["peak_hour"] = int(h.idxmax()); out["peak_activity"] = int(h.max())
         return out
 
-    def generate_ai_summary(self, df: pd.DataFrame, selected_user: str = "Overall") -> str:
+    @profiled()
+    def generate_ai_summary(self, df: pd.DataFrame, selected_user: str = "Overall",
+                            sentiment: pd.DataFrame = None, topics: list = None, patterns: dict = None) -> str:
         if df is None or df.empty:
             return "No data available for AI summary."
-        if selected_user != "Overall":
-            df = df[df["user"] == selected_user]
-        total = len(df); users = df["user"].nunique()
-        sent = self.analyze_sentiment(df, selected_user)
+        # Callers holding precomputed analyses (AnalysisBundle) pass them in;
+        # the rest slice the full chat through the shared per-user index
+        sent = sentiment if sentiment is not None else self.analyze_sentiment(df, selected_user)
         avg = float(sent["avg_sentiment"].mean()) if not sent.empty else 0.0
-        topics, _ = self.extract_topics(df, selected_user, n_topics=3)
-        pat = self.analyze_communication_patterns(df, selected_user)
+        if topics is None:
+            topics, _ = self.extract_topics(df, selected_user, n_topics=3)
+        pat = patterns if patterns is not None else self.analyze_communication_patterns(df, selected_user)
+        df = user_frame(df, selected_user)
+        total = len(df); users = df["user"].nunique()
         lines = []
         lines.append("🤖 AI-Generated Summary Report")
         lines.append("")
@@ -144,7 +120,8 @@ class AIAnalyzer:
         lines.append(f"- Total Messages: {total:,}")
         lines.append(f"- Unique Participants: {users}")
         if "only_date" in df.columns:
-            lines.append(f"- Analysis Period: {df['only_date'].min()} to {df['only_date'].max()}")
+            start, end = pd.Timestamp(df["only_date"].min()).date(), pd.Timestamp(df["only_date"].max()).date()
+            lines.append(f"- Analysis Period: {start} to {end}")
         lines.append("")
         lines.append("😊 Sentiment")
         label = "Positive" if avg > 0.1 else ("Neutral" if avg > -0.1 else "Negative")
@@ -161,6 +138,8 @@ class AIAnalyzer:
         if "peak_hour" in pat: lines.append(f"- Peak Hour: {pat['peak_hour']:02d}:00")
         if "avg_message_length" in pat: lines.append(f"- Avg Message Length: {pat['avg_message_length']:.0f} chars")
         if "avg_response_time" in pat: lines.append(f"- Avg Response Time: {pat['avg_response_time']:.1f} minutes")
+        if "median_response_time" in pat: lines.append(f"- Median Response Time: {pat['median_response_time']:.1f} minutes")
+        if "sessions" in pat: lines.append(f"- Conversation Sessions: {pat['sessions']:,} (avg {pat['avg_session_messages']:.1f} messages)")
         lines.append("")
         lines.append("💡 Insight")
         engagement = "high" if total > 1000 else ("moderate" if total > 500 else "low")
@@ -0,0 +1,166 @@
+"""
+Every analysis of one chat for one user, computed lazily and at most once.
+
+The dashboard, AI Insights, the AI summary and both report generators read
+from the same bundle, so a rerun (or a second consumer) reuses what was
+already computed. Bundles are kept per (chat hash, user) in a small LRU and
+hold their frame weakly, so the chat cache alone decides how long a parsed
+chat stays in memory.
+"""
+import threading
+import weakref
+from collections import OrderedDict
+
+import helper
+from ai_analyzer import AIAnalyzer
+
+
+class AnalysisBundle:
+    def __init__(self, df, selected_user="Overall", detected_format="Unknown", chat_hash=None, analyzer=None):
+        self._df = weakref.ref(df) if df is not None else None
+        self.chat_hash = chat_hash
+        self.selected_user = selected_user
+        self.detected_format = detected_format
+        self.analyzer = analyzer or AIAnalyzer()
+        self._memo = {}
+        self._lock = threading.RLock()
+
+    def _get(self, name, compute):
+        with self._lock:
+            if name not in self._memo:
+                self._memo[name] = compute()
+            return self._memo[name]
+
+    @property
+    def df(self):
+        """The chat frame, or None once it was freed."""
+        return self._df() if self._df is not None else None
+
+    def has(self, name):
+        with self._lock:
+            return name in self._memo
+
+    def seed(self, name, value):
+        """Store a result computed elsewhere (a background job)."""
+        with self._lock:
+            self._memo[name] = value
+
+    # Dashboard
+    def stats(self):
+        """(messages, words, media messages, links)"""
+        return self._get("stats", lambda: helper.fetch_stats(self.selected_user, self.df))
+
+    def date_range(self):
+        return self._get("date_range", lambda: helper.date_range(self.df))
+
+    def monthly_timeline(self):
+        return self._get("monthly_timeline", lambda: helper.monthly_timeline(self.selected_user, self.df))
+
+    def daily_timeline(self):
+        return self._get("daily_timeline", lambda: helper.daily_timeline(self.selected_user, self.df))
+
+    def week_activity(self):
+        return self._get("week_activity", lambda: helper.week_activity_map(self.selected_user, self.df))
+
+    def month_activity(self):
+        return self._get("month_activity", lambda: helper.month_activity_map(self.selected_user, self.df))
+
+    def heatmap(self):
+        return self._get("heatmap", lambda: helper.activity_heatmap(self.selected_user, self.df))
+
+    def busy_users(self):
+        """(message counts, percentage table) over the whole chat"""
+        return self._get("busy_users", lambda: helper.most_busy_users(self.df))
+
+    def wordcloud(self):
+        return self._get("wordcloud", lambda: helper.create_wordcloud(self.selected_user, self.df))
+
+    def common_words(self):
+        return self._get("common_words", lambda: helper.most_common_words(self.selected_user, self.df))
+
+    def emojis(self):
+        return self._get("emojis", lambda: helper.emoji_helper(self.selected_user, self.df))
+
+    # AI
+    def sentiment(self):
+        return self._get("sentiment", lambda: self.analyzer.analyze_sentiment(self.df, self.selected_user))
+
+    def topics(self, n_topics=3):
+        return self._get(f"topics_{n_topics}", lambda: self.analyzer.extract_topics(self.df, self.selected_user, n_topics=n_topics))
+
+    def patterns(self):
+        return self._get("patterns", lambda: self.analyzer.analyze_communication_patterns(self.df, self.selected_user))
+
+    def ai_summary(self):
+        return self._get("ai_summary", lambda: self.analyzer.generate_ai_summary(
+            self.df, self.selected_user,
+            sentiment=self.sentiment(), topics=self.topics(3)[0], patterns=self.patterns(),
+        ))
+
+    # Reports
+    def analysis_data(self):
+        """KPIs passed to the report generators and saved with a report."""
+        def build():
+            num_messages, words, num_media_messages, num_links = self.stats()
+            data = {
+                "total_messages": num_messages,
+                "total_words": words,
+                "media_messages": num_media_messages,
+                "links_shared": num_links,
+                "date_range": "{} to {}".format(*self.date_range()),
+            }
+            try: data["ai_summary"] = self.ai_summary()
+            except Exception: pass
+            return data
+        return self._get("analysis_data", build)
+
+    def charts_data(self):
+        def build():
+            charts = {}
+            timeline = self.monthly_timeline()
+            if not timeline.empty:
+                charts["timeline"] = timeline
+            if self.selected_user == "Overall":
+                x, _ = self.busy_users()
+                if not x.empty:
+                    charts["user_activity"] = x
+            words = self.common_words()
+            if not words.empty and len(words.columns) >= 2:
+                charts["word_analysis"] = words
+            return charts
+        return self._get("charts_data", build)
+
+    def pdf_report(self, generator):
+        return self._get("pdf_report", lambda: generator.generate_pdf_report(
+            self.analysis_data(), self.selected_user, self.detected_format, self.charts_data()).getvalue())
+
+    def docx_report(self, generator):
+        return self._get("docx_report", lambda: generator.generate_docx_report(
+            self.analysis_data(), self.selected_user, self.detected_format, self.charts_data()).getvalue())
+
+
+class BundleCache:
+    """
+    Analysis bundles keyed by (chat hash, user), least recently used evicted.
+    Bundles whose frame was freed are dropped on the next ``get``.
+    """
+
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self._bundles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, chat_hash, selected_user, df, detected_format="Unknown"):
+        key = (chat_hash, selected_user)
+        with self._lock:
+            for old_key in [k for k, b in self._bundles.items() if b.df is None]:
+                del self._bundles[old_key]
+            bundle = self._bundles.get(key)
+            if bundle is not None and bundle.df is df:
+                self._bundles.move_to_end(key)
+                return bundle
+            bundle = self._bundles[key] = AnalysisBundle(df, selected_user, detected_format, chat_hash)
+            self._bundles.move_to_end(key)
+            while len(self._bundles) > self.max_entries:
+                self._bundles.popitem(last=False)
+            return bundle
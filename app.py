@@ -1,12 +1,20 @@
 import streamlit as st
 import matplotlib.pyplot as plt
 import seaborn as sns
-import re
+import json
+import os
 from datetime import datetime
 
 import auth
-import preprocessor, helper
+import profiling
+import chat_cache
+import db_pool
+import frame_cache
+import incremental
+import jobs
+from topics import TOPICS_KEY
 from ai_analyzer import AIAnalyzer
+from analysis_bundle import AnalysisBundle, BundleCache
 from report_generator import ReportGenerator
 import database
 
@@ -57,49 +65,409 @@ else:
             if k in st.session_state: del st.session_state[k]
         st.rerun()
 
-# DB init
+# DB init: migrations run once per server process, not on every rerun
+@st.cache_resource
+def bootstrap_schema():
+    return database.init_schema()
+
 try:
-    database.init_schema()
+    bootstrap_schema()
 except Exception as e:
     st.warning(f"DB init warning: {e}")
 
+# Counts script runs, so a failed background job is resubmitted on the next one
+run_number = st.session_state['run_number'] = st.session_state.get('run_number', 0) + 1
+
 # Navigation
 section = st.sidebar.radio("Navigate", ["Analyze", "AI Insights", "My Reports", "Profile", "Help"])
 
-# Detect format
-def detect_export_format(data):
-    ios_pattern = r'\[\d{1,2}/\d{1,2}/\d{2,4},\s\d{1,2}:\d{2}:\d{2}\s?(AM|PM)?\]'
-    if re.search(ios_pattern, data): return 'iOS'
-    android_pattern = r'\d{1,2}/\d{1,2}/\d{2,4},\s\d{1,2}:\d{2}\s-\s'
-    if re.search(android_pattern, data): return 'Android'
-    return 'Unknown'
+# Optional per-rerun stage timings, shown at the bottom of the sidebar
+TIMING_RUNS = 20
+show_timings = st.sidebar.checkbox("⏱️ Show stage timings", key="show_timings")
+if show_timings: profiling.start_run(section)
+else: profiling.end_run()
 
 ai = AIAnalyzer()
 rep = ReportGenerator()
 
+@st.cache_resource
+def get_chat_cache():
+    # One cache per server process, shared by every session and rerun
+    return chat_cache.ChatCache.from_env()
+
+@st.cache_resource
+def get_prefix_index():
+    return incremental.PrefixIndex()
+
+@st.cache_resource
+def get_bundle_cache():
+    return BundleCache()
+
+@st.cache_resource
+def get_job_queue():
+    return jobs.JobQueue.from_env()
+
+def background(chat_hash, task, *args, key=None, **kwargs):
+    # (result, None) once the job is done, (None, status) while it runs or
+    # has failed; a failed job is shown once and resubmitted on the next rerun
+    queue = get_job_queue()
+    failed = st.session_state.setdefault('failed_jobs', {})
+    job_id = queue.find(chat_hash, task, key)
+    if job_id is None or queue.status(job_id) is None or failed.get(job_id, run_number) < run_number:
+        job_id = queue.submit(chat_hash, task, *args, key=key, **kwargs)
+    status = queue.status(job_id)
+    if status['state'] == jobs.FAILED:
+        failed.setdefault(job_id, run_number)
+    if status['state'] == jobs.DONE:
+        return queue.result(job_id), None
+    return None, status
+
+def run_ai_jobs(df, chat_hash):
+    # Sentiment and topics are computed in background workers; finished
+    # results are attached to the shared frame, so the bundle finds them
+    pending = []
+    for name, task in [('sentiment', 'sentiment'), (TOPICS_KEY, 'topics')]:
+        if not frame_cache.has(df, name):
+            result, status = background(chat_hash, task, df)
+            if status: pending.append(status)
+            else: frame_cache.seed(df, name, result)
+    return pending
+
+def report_kpis(bundle):
+    # (KPIs with the AI summary, pending job statuses); the KPIs are built by
+    # a background job once sentiment and topics are done, and kept on the bundle
+    if bundle.has('analysis_data'):
+        return bundle.analysis_data(), []
+    pending = run_ai_jobs(bundle.df, bundle.chat_hash)
+    if pending:
+        return None, pending
+    derived = {k: v for k, v in frame_cache.entries(bundle.df).items() if k in ('sentiment', TOPICS_KEY)}
+    data, status = background(bundle.chat_hash, 'analysis', bundle.df, bundle.selected_user,
+                              bundle.detected_format, derived, key=bundle.selected_user)
+    if status:
+        return None, [status]
+    bundle.seed('analysis_data', data)
+    if 'ai_summary' in data: bundle.seed('ai_summary', data['ai_summary'])
+    return data, []
+
+@st.fragment(run_every="2s")
+def wait_for_jobs(statuses):
+    # Only this block reruns while jobs are busy; the page reruns once they
+    # finish. Failed jobs are only reported, so they don't rerun the page
+    queue = get_job_queue()
+    for status in statuses:
+        if status['state'] == jobs.FAILED:
+            st.error(f"Background {status['task']} job failed: {status['error']}")
+    running = [s for s in statuses if s['state'] != jobs.FAILED]
+    if not running:
+        return
+    running = [s for s in (queue.status(s['id']) for s in running) if s is not None]
+    for status in running:
+        st.progress(status['progress'], text=f"{status['message'] or status['task']} ({status['seconds']:.0f}s)")
+    if all(s['state'] in (jobs.DONE, jobs.FAILED) for s in running):
+        st.rerun()
+
 # Shared upload
 st.sidebar.title("💬 WhatsApp Chat Analyzer")
 uploaded_file = st.sidebar.file_uploader("Choose your WhatsApp chat export file", type=['txt'],
                                          help="Export your WhatsApp chat as a .txt file from iOS or Android")
 selected_user = "Overall"
 df = None
+chat_hash = None
+bundle = None
 detected_format = "Unknown"
+parsing = None
 
 if section in ["Analyze","AI Insights"] and uploaded_file is not None:
     try:
-        data = uploaded_file.getvalue().decode("utf-8")
-        detected_format = detect_export_format(data)
-        with st.spinner("🔄 Processing your chat..."):
-            df = preprocessor.preprocess(data)
+        # Hashed once per upload; reruns reuse it through the uploader's file id
+        cached_hash = st.session_state.get('upload_hash')
+        if cached_hash is None or cached_hash[0] != uploaded_file.file_id:
+            cached_hash = st.session_state['upload_hash'] = (uploaded_file.file_id,
+                                                             chat_cache.content_hash(uploaded_file))
+        chat_hash = cached_hash[1]
+        def _parse():
+            # Parsed by a background job, so the page stays responsive; None until it is done
+            global parsing
+            parsed, parsing = background(chat_hash, 'preprocess', jobs.spool(uploaded_file, chat_hash))
+            if parsed is not None:
+                # The chat cache keeps the frame from here on
+                get_job_queue().forget(get_job_queue().find(chat_hash, 'preprocess'))
+                jobs.unspool(chat_hash)
+            return parsed
+        # A newer export of a chat seen before only has its new tail parsed
+        df = incremental.get_or_parse(get_chat_cache(), get_prefix_index(), uploaded_file, chat_hash, _parse)
+    except Exception as e:
+        st.error(f"❌ Error processing file: {str(e)}")
+
+if parsing is not None:
+    st.info("🔄 Processing your chat...")
+    wait_for_jobs([parsing])
+    st.stop()
+
+if df is not None:
+    try:
+        detected_format = df.attrs.get('format', 'Unknown').split('_')[0]
         user_list = df['user'].unique().tolist()
         if 'group_notification' in user_list: user_list.remove('group_notification')
         user_list.sort(); user_list.insert(0,"Overall")
         selected_user = st.sidebar.selectbox("📊 Show analysis for:", user_list)
+        bundle = get_bundle_cache().get(chat_hash, selected_user, df, detected_format)
         if detected_format != 'Unknown': st.sidebar.success(f"📱 Detected: {detected_format}")
         else: st.sidebar.warning("⚠️ Could not detect format")
     except Exception as e:
         st.error(f"❌ Error processing file: {str(e)}")
 
+def load_report_dataset(rec):
+    # Parsed chat saved with a report, through the chat cache; None if missing
+    path, key = rec.get('dataset_path'), rec.get('dataset_hash')
+    if not path or not key or not os.path.exists(path):
+        return None
+    return get_chat_cache().get_or_parse(key, lambda: chat_cache.load_dataset(path))
+
+def report_download(bundle, kind, label, file_name, mime):
+    # Reports are built by a background job once asked for, PDF and DOCX
+    # together; returns the statuses of jobs still running for them
+    request = f"{kind}:{bundle.chat_hash}:{bundle.selected_user}"
+    requested = st.session_state.setdefault('requested_reports', set())
+    name = f"{kind}_report"
+    if request not in requested and not bundle.has(name):
+        if not st.button(f"Prepare {label}", key=f"prepare:{request}"):
+            return []
+        requested.add(request)
+    if not bundle.has(name):
+        kpis, pending = report_kpis(bundle)
+        if kpis is None:
+            return pending
+        reports, status = background(bundle.chat_hash, 'report', kpis, bundle.selected_user,
+                                     bundle.detected_format, bundle.charts_data(), key=bundle.selected_user)
+        if status:
+            return [status]
+        for other, data in reports.items():
+            bundle.seed(f"{other}_report", data)
+    data = bundle.pdf_report(rep) if kind == "pdf" else bundle.docx_report(rep)
+    st.download_button(f"Download {label}", data=data, file_name=file_name, mime=mime, key=f"download:{request}")
+    return []
+
+@profiling.profiled("app.render_charts")
+def render_charts(bundle):
+    num_messages, words, num_media_messages, num_links = bundle.stats()
+    st.title("📊 WhatsApp Chat Analysis")
+    st.markdown(f"**Analysis for:** `{bundle.selected_user}` | **Format:** `{bundle.detected_format}`")
+
+    c1,c2,c3,c4 = st.columns(4)
+    c1.metric("💬 Total Messages", f"{num_messages:,}")
+    c2.metric("📝 Total Words", f"{words:,}")
+    c3.metric("📸 Media Shared", f"{num_media_messages:,}")
+    c4.metric("🔗 Links Shared", f"{num_links:,}")
+
+    st.markdown("---")
+
+    colA,colB = st.columns(2)
+    with colA:
+        st.subheader("📅 Monthly Timeline")
+        timeline = bundle.monthly_timeline()
+        if not timeline.empty:
+            fig, ax = plt.subplots(figsize=(10,5))
+            ax.plot(timeline['time'], timeline['message'], color='green', marker='o', linewidth=2)
+            ax.set_xlabel('Month-Year'); ax.set_ylabel('Message Count'); ax.grid(True, alpha=0.3)
+            plt.xticks(rotation=45); plt.tight_layout(); st.pyplot(fig)
+        else: st.info("No timeline data available")
+    with colB:
+        st.subheader("📆 Daily Timeline")
+        daily = bundle.daily_timeline()
+        if not daily.empty:
+            fig, ax = plt.subplots(figsize=(10,5))
+            ax.plot(daily['only_date'], daily['message'], color='black', alpha=0.7, linewidth=1)
+            ax.set_xlabel('Date'); ax.set_ylabel('Message Count'); ax.grid(True, alpha=0.3)
+            plt.xticks(rotation=45); plt.tight_layout(); st.pyplot(fig)
+        else: st.info("No daily timeline data available")
+
+    st.markdown("---")
+    st.subheader("📈 Activity Patterns")
+    colC,colD = st.columns(2)
+    with colC:
+        st.write("**Most Busy Day**")
+        busy_day = bundle.week_activity()
+        if not busy_day.empty:
+            fig, ax = plt.subplots(figsize=(8,6))
+            bars = ax.bar(busy_day.index, busy_day.values, color='purple', alpha=0.8)
+            ax.set_xlabel('Day of Week'); ax.set_ylabel('Message Count'); ax.grid(True, alpha=0.3)
+            for b in bars: ax.text(b.get_x()+b.get_width()/2., b.get_height(), f'{int(b.get_height())}', ha='center', va='bottom')
+            plt.xticks(rotation=45); plt.tight_layout(); st.pyplot(fig)
+        else: st.info("No activity data available")
+    with colD:
+        st.write("**Most Busy Month**")
+        busy_month = bundle.month_activity()
+        if not busy_month.empty:
+            fig, ax = plt.subplots(figsize=(8,6))
+            bars = ax.bar(busy_month.index, busy_month.values, color='orange', alpha=0.8)
+            ax.set_xlabel('Month'); ax.set_ylabel('Message Count'); ax.grid(True, alpha=0.3)
+            for b in bars: ax.text(b.get_x()+b.get_width()/2., b.get_height(), f'{int(b.get_height())}', ha='center', va='bottom')
+            plt.xticks(rotation=45); plt.tight_layout(); st.pyplot(fig)
+        else: st.info("No monthly activity data available")
+
+    st.markdown("---")
+    st.subheader("🔥 Weekly Activity Heatmap")
+    heat = bundle.heatmap()
+    if not heat.empty:
+        fig, ax = plt.subplots(figsize=(12,6))
+        sns.heatmap(heat, cmap='YlOrRd', ax=ax, annot=True, fmt='.0f', cbar_kws={'label':'Message Count'})
+        ax.set_xlabel('Time Period (Hour)'); ax.set_ylabel('Day of Week'); ax.set_title('Message Activity Throughout the Week')
+        plt.tight_layout(); st.pyplot(fig)
+    else: st.info("No heatmap data available")
+
+    if bundle.selected_user == 'Overall':
+        st.markdown("---")
+        st.subheader("👥 Most Active Users")
+        x, new_df = bundle.busy_users()
+        if not x.empty:
+            cx, cy = st.columns(2)
+            with cx:
+                st.write("**Message Count by User**")
+                fig, ax = plt.subplots(figsize=(8,6))
+                bars = ax.bar(range(len(x)), x.values, color='red', alpha=0.8)
+                ax.set_xlabel('Users'); ax.set_ylabel('Message Count')
+                ax.set_xticks(range(len(x))); ax.set_xticklabels(x.index, rotation=45, ha='right')
+                ax.grid(True, alpha=0.3)
+                for b in bars: ax.text(b.get_x()+b.get_width()/2., b.get_height(), f'{int(b.get_height())}', ha='center', va='bottom')
+                plt.tight_layout(); st.pyplot(fig)
+            with cy:
+                st.write("**User Activity Percentage**"); st.dataframe(new_df, use_container_width=True)
+
+    st.markdown("---")
+    colW, colZ = st.columns(2)
+    with colW:
+        st.subheader("☁️ Word Cloud")
+        try:
+            df_wc = bundle.wordcloud()
+            fig, ax = plt.subplots(figsize=(8,6)); ax.imshow(df_wc, interpolation='bilinear')
+            ax.axis("off"); ax.set_title('Most Frequently Used Words', fontsize=14, fontweight='bold', pad=20)
+            st.pyplot(fig)
+        except Exception as e: st.error(f"Could not generate word cloud: {str(e)}")
+    with colZ:
+        st.subheader("📝 Most Common Words")
+        mdf = bundle.common_words()
+        if not mdf.empty and len(mdf.columns) >= 2:
+            top_words = mdf.iloc[:, :2].copy()
+            top_words.columns = ["word","count"]
+            top_words = top_words.head(15)
+            fig, ax = plt.subplots(figsize=(8,8))
+            bars = ax.barh(top_words["word"].astype(str), top_words["count"].astype(float),                 color='skyblue', alpha=0.8)
+            ax.set_xlabel('Frequency'); ax.set_ylabel('Words'); ax.set_title('Top 15 Most Common Words')
+            ax.grid(True, alpha=0.3)
+            for bar in bars:
+                width = bar.get_width()
+                ax.text(width, bar.get_y()+bar.get_height()/2., f'{int(width)}', ha='left', va='center')
+            plt.tight_layout(); st.pyplot(fig)
+        else:
+            st.info("No meaningful words found")
+
+    st.markdown("---")
+    st.subheader("😊 Emoji Analysis")
+    emoji_df = bundle.emojis()
+    if not emoji_df.empty and len(emoji_df.columns) >= 2 and len(emoji_df) > 0:
+        cE1, cE2 = st.columns(2)
+        with cE1:
+            st.write("**Most Used Emojis**")
+            display_df = emoji_df.copy(); display_df.columns = ['Emoji','Count']
+            st.dataframe(display_df.head(15), use_container_width=True)
+        with cE2:
+            st.write("**Emoji Distribution**")
+            fig, ax = plt.subplots(figsize=(8,8))
+            top_emojis = emoji_df.head(8)
+            wedges, texts, autotexts = ax.pie(top_emojis.iloc[:,1], labels=top_emojis.iloc[:,0],
+                                               autopct="%0.1f%%", startangle=90, textprops={'fontsize': 12})
+            for t in texts: t.set_fontsize(20)
+            for autot in autotexts: autot.set_color('white'); autot.set_fontweight('bold')
+            ax.set_title('Top Emojis Used', fontsize=16, fontweight='bold', pad=20)
+            st.pyplot(fig)
+
+@profiling.profiled("app.render_dashboard")
+def render_dashboard(bundle):
+    render_charts(bundle)
+
+    # Quick Stats
+    if st.sidebar.button("📈 Show Quick Stats"):
+        st.subheader("📊 Quick Chat Statistics")
+        q1,q2,q3 = st.columns(3)
+        first_day, last_day = bundle.date_range()
+        with q1: st.metric("📅 Date Range", f"{first_day} to {last_day}")
+        with q2:
+            active_user = bundle.df[bundle.df['user']!='group_notification']['user'].value_counts().index if len(bundle.df[bundle.df['user']!='group_notification'])>0 else "N/A"
+            st.metric("🏆 Most Active User", active_user)
+        with q3:
+            total_days = (last_day - first_day).days
+            avg_messages = len(bundle.df) / max(total_days, 1); st.metric("📈 Avg Messages/Day", f"{avg_messages:.1f}")
+
+    # Downloads and Save; the report KPIs (and the AI summary in them) are
+    # only computed once a report is prepared or saved
+    st.markdown("---")
+    d1,d2,d3 = st.columns(3)
+    pending = []
+    with d1:
+        try: pending += report_download(bundle, "pdf", "PDF Report", file_name="whatsapp_report.pdf", mime="application/pdf")
+        except Exception as e: st.error(f"Could not build the PDF report: {e}")
+    with d2:
+        try:
+            pending += report_download(bundle, "docx", "DOCX Report", file_name="whatsapp_report.docx",
+                                       mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document")
+        except Exception as e: st.error(f"Could not build the DOCX report: {e}")
+    with d3:
+        def _sanitize_for_json(d):
+            clean = {}
+            for k,v in d.items():
+                try:
+                    if hasattr(v, 'item'):
+                        v = v.item()
+                    if isinstance(v, (int, float, str)) or v is None:
+                        clean[k] = v
+                    else:
+                        clean[k] = str(v)
+                except Exception:
+                    clean[k] = str(v)
+            return clean
+        # A save waits for the KPI job, across reruns if needed
+        save_request = f"save:{bundle.chat_hash}:{bundle.selected_user}"
+        if st.button("Save Report", type="primary"):
+            st.session_state[save_request] = True
+        kpis = None
+        if st.session_state.get(save_request):
+            try:
+                kpis, waiting = report_kpis(bundle)
+                pending += waiting
+            except Exception as e:
+                del st.session_state[save_request]
+                st.error(f"Could not build the report KPIs: {e}")
+        if kpis is not None:
+            del st.session_state[save_request]
+            with st.spinner("Saving report..."):
+                try:
+                    safe_kpis = _sanitize_for_json(kpis | {
+                        "selected_user": bundle.selected_user, "export_format": bundle.detected_format})
+                    # The parsed chat is kept so the report can be reopened with its charts;
+                    # without it (no Parquet engine, disk full) the report is saved alone
+                    try: path = chat_cache.save_dataset(bundle.chat_hash, bundle.df)
+                    except Exception as e:
+                        path = None
+                        st.warning(f"Chat data not stored with the report: {e}")
+                    rid = database.create_report(
+                        st.session_state['user_email'],
+                        f"Report - {bundle.selected_user} - {datetime.now():%Y-%m-%d}",
+                        safe_kpis,
+                        safe_kpis.get("ai_summary"),
+                        dataset_path=path,
+                        dataset_hash=bundle.chat_hash,
+                    )
+                    st.session_state['last_saved_report_id'] = rid
+                    st.toast(f"Saved report #{rid}")
+                    st.success("Report saved. Find it under 'My Reports'.")
+                except Exception as e:
+                    st.error("Save failed. Please ensure the database is reachable and you are logged in.")
+                    st.exception(e)
+    if pending:
+        wait_for_jobs(list({s['id']: s for s in pending}.values()))
+
 # Analyze
 if section == "Analyze":
     st.header("Analyze")
@@ -107,229 +475,47 @@ if section == "Analyze":
         st.info("👆 Upload a chat file to start analysis.")
     else:
         if st.sidebar.button("🚀 Show Analysis", type="primary"):
-            num_messages, words, num_media_messages, num_links = helper.fetch_stats(selected_user, df)
-            st.title("📊 WhatsApp Chat Analysis")
-            st.markdown(f"**Analysis for:** `{selected_user}` | **Format:** `{detected_format}`")
-
-            c1,c2,c3,c4 = st.columns(4)
-            c1.metric("💬 Total Messages", f"{num_messages:,}")
-            c2.metric("📝 Total Words", f"{words:,}")
-            c3.metric("📸 Media Shared", f"{num_media_messages:,}")
-            c4.metric("🔗 Links Shared", f"{num_links:,}")
-
-            st.markdown("---")
-            charts_data = {}
-
-            colA,colB = st.columns(2)
-            with colA:
-                st.subheader("📅 Monthly Timeline")
-                timeline = helper.monthly_timeline(selected_user, df)
-                if not timeline.empty:
-                    fig, ax = plt.subplots(figsize=(10,5))
-                    ax.plot(timeline['time'], timeline['message'], color='green', marker='o', linewidth=2)
-                    ax.set_xlabel('Month-Year'); ax.set_ylabel('Message Count'); ax.grid(True, alpha=0.3)
-                    plt.xticks(rotation=45); plt.tight_layout(); st.pyplot(fig)
-                    charts_data["timeline"] = timeline
-                else: st.info("No timeline data available")
-            with colB:
-                st.subheader("📆 Daily Timeline")
-                daily = helper.daily_timeline(selected_user, df)
-                if not daily.empty:
-                    fig, ax = plt.subplots(figsize=(10,5))
-                    ax.plot(daily['only_date'], daily['message'], color='black', alpha=0.7, linewidth=1)
-                    ax.set_xlabel('Date'); ax.set_ylabel('Message Count'); ax.grid(True, alpha=0.3)
-                    plt.xticks(rotation=45); plt.tight_layout(); st.pyplot(fig)
-                else: st.info("No daily timeline data available")
-
-            st.markdown("---")
-            st.subheader("📈 Activity Patterns")
-            colC,colD = st.columns(2)
-            with colC:
-                st.write("**Most Busy Day**")
-                busy_day = helper.week_activity_map(selected_user, df)
-                if not busy_day.empty:
-                    fig, ax = plt.subplots(figsize=(8,6))
-                    bars = ax.bar(busy_day.index, busy_day.values, color='purple', alpha=0.8)
-                    ax.set_xlabel('Day of Week'); ax.set_ylabel('Message Count'); ax.grid(True, alpha=0.3)
-                    for b in bars: ax.text(b.get_x()+b.get_width()/2., b.get_height(), f'{int(b.get_height())}', ha='center', va='bottom')
-                    plt.xticks(rotation=45); plt.tight_layout(); st.pyplot(fig)
-                else: st.info("No activity data available")
-            with colD:
-                st.write("**Most Busy Month**")
-                busy_month = helper.month_activity_map(selected_user, df)
-                if not busy_month.empty:
-                    fig, ax = plt.subplots(figsize=(8,6))
-                    bars = ax.bar(busy_month.index, busy_month.values, color='orange', alpha=0.8)
-                    ax.set_xlabel('Month'); ax.set_ylabel('Message Count'); ax.grid(True, alpha=0.3)
-                    for b in bars: ax.text(b.get_x()+b.get_width()/2., b.get_height(), f'{int(b.get_height())}', ha='center', va='bottom')
-                    plt.xticks(rotation=45); plt.tight_layout(); st.pyplot(fig)
-                else: st.info("No monthly activity data available")
-
-            st.markdown("---")
-            st.subheader("🔥 Weekly Activity Heatmap")
-            heat = helper.activity_heatmap(selected_user, df)
-            if not heat.empty:
-                fig, ax = plt.subplots(figsize=(12,6))
-                sns.heatmap(heat, cmap='YlOrRd', ax=ax, annot=True, fmt='.0f', cbar_kws={'label':'Message Count'})
-                ax.set_xlabel('Time Period (Hour)'); ax.set_ylabel('Day of Week'); ax.set_title('Message Activity Throughout the Week')
-                plt.tight_layout(); st.pyplot(fig)
-            else: st.info("No heatmap data available")
-
-            if selected_user == 'Overall':
-                st.markdown("---")
-                st.subheader("👥 Most Active Users")
-                x, new_df = helper.most_busy_users(df)
-                if not x.empty:
-                    charts_data["user_activity"] = x
-                    cx, cy = st.columns(2)
-                    with cx:
-                        st.write("**Message Count by User**")
-                        fig, ax = plt.subplots(figsize=(8,6))
-                        bars = ax.bar(range(len(x)), x.values, color='red', alpha=0.8)
-                        ax.set_xlabel('Users'); ax.set_ylabel('Message Count')
-                        ax.set_xticks(range(len(x))); ax.set_xticklabels(x.index, rotation=45, ha='right')
-                        ax.grid(True, alpha=0.3)
-                        for b in bars: ax.text(b.get_x()+b.get_width()/2., b.get_height(), f'{int(b.get_height())}', ha='center', va='bottom')
-                        plt.tight_layout(); st.pyplot(fig)
-                    with cy:
-                        st.write("**User Activity Percentage**"); st.dataframe(new_df, use_container_width=True)
-
-            st.markdown("---")
-            colW, colZ = st.columns(2)
-            with colW:
-                st.subheader("☁️ Word Cloud")
-                try:
-                    df_wc = helper.create_wordcloud(selected_user, df)
-                    fig, ax = plt.subplots(figsize=(8,6)); ax.imshow(df_wc, interpolation='bilinear')
-                    ax.axis("off"); ax.set_title('Most Frequently Used Words', fontsize=14, fontweight='bold', pad=20)
-                    st.pyplot(fig)
-                except Exception as e: st.error(f"Could not generate word cloud: {str(e)}")
-            with colZ:
-                st.subheader("📝 Most Common Words")
-                mdf = helper.most_common_words(selected_user, df)
-                if not mdf.empty and len(mdf.columns) >= 2:
-                    charts_data["word_analysis"] = mdf
-                    top_words = mdf.iloc[:, :2].copy()
-                    top_words.columns = ["word","count"]
-                    top_words = top_words.head(15)
-                    fig, ax = plt.subplots(figsize=(8,8))
-                    bars = ax.barh(top_words["word"].astype(str), top_words["count"].astype(float),                 color='skyblue', alpha=0.8)
-                    ax.set_xlabel('Frequency'); ax.set_ylabel('Words'); ax.set_title('Top 15 Most Common Words')
-                    ax.grid(True, alpha=0.3)
-                    for bar in bars:
-                        width = bar.get_width()
-                        ax.text(width, bar.get_y()+bar.get_height()/2., f'{int(width)}', ha='left', va='center')
-                    plt.tight_layout(); st.pyplot(fig)
-                else:
-                    st.info("No meaningful words found")
-
-            st.markdown("---")
-            st.subheader("😊 Emoji Analysis")
-            emoji_df = helper.emoji_helper(selected_user, df)
-            if not emoji_df.empty and len(emoji_df.columns) >= 2 and len(emoji_df) > 0:
-                cE1, cE2 = st.columns(2)
-                with cE1:
-                    st.write("**Most Used Emojis**")
-                    display_df = emoji_df.copy(); display_df.columns = ['Emoji','Count']
-                    st.dataframe(display_df.head(15), use_container_width=True)
-                with cE2:
-                    st.write("**Emoji Distribution**")
-                    fig, ax = plt.subplots(figsize=(8,8))
-                    top_emojis = emoji_df.head(8)
-                    wedges, texts, autotexts = ax.pie(top_emojis.iloc[:,1], labels=top_emojis.iloc[:,0],
-                                                       autopct="%0.1f%%", startangle=90, textprops={'fontsize': 12})
-                    for t in texts: t.set_fontsize(20)
-                    for autot in autotexts: autot.set_color('white'); autot.set_fontweight('bold')
-                    ax.set_title('Top Emojis Used', fontsize=16, fontweight='bold', pad=20)
-                    st.pyplot(fig)
-
-            # Quick Stats
-            if st.sidebar.button("📈 Show Quick Stats"):
-                st.subheader("📊 Quick Chat Statistics")
-                q1,q2,q3 = st.columns(3)
-                with q1: st.metric("📅 Date Range", f"{df['only_date'].min()} to {df['only_date'].max()}")
-                with q2:
-                    active_user = df[df['user']!='group_notification']['user'].value_counts().index if len(df[df['user']!='group_notification'])>0 else "N/A"
-                    st.metric("🏆 Most Active User", active_user)
-                with q3:
-                    total_days = (df['only_date'].max() - df['only_date'].min()).days
-                    avg_messages = len(df) / max(total_days, 1); st.metric("📈 Avg Messages/Day", f"{avg_messages:.1f}")
-
-            # Downloads and Save
-            analysis_data = {
-                "total_messages": num_messages,
-                "total_words": words,
-                "media_messages": num_media_messages,
-                "links_shared": num_links,
-                "date_range": f"{df['only_date'].min()} to {df['only_date'].max()}",
-            }
-            try: analysis_data["ai_summary"] = AIAnalyzer().generate_ai_summary(df, selected_user)
-            except Exception: pass
-
-            st.markdown("---")
-            d1,d2,d3 = st.columns(3)
-            with d1:
-                pdf_buf = rep.generate_pdf_report(analysis_data, selected_user, detected_format, charts_data)
-                st.download_button("Download PDF Report", data=pdf_buf.getvalue(), file_name="whatsapp_report.pdf", mime="application/pdf")
-            with d2:
-                docx_buf = rep.generate_docx_report(analysis_data, selected_user, detected_format, charts_data)
-                st.download_button("Download DOCX Report", data=docx_buf.getvalue(),
-                                   file_name="whatsapp_report.docx",
-                                   mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document")
-            with d3:
-                def _sanitize_for_json(d):
-                    clean = {}
-                    for k,v in d.items():
-                        try:
-                            if hasattr(v, 'item'):
-                                v = v.item()
-                            if isinstance(v, (int, float, str)) or v is None:
-                                clean[k] = v
-                            else:
-                                clean[k] = str(v)
-                        except Exception:
-                            clean[k] = str(v)
-                    return clean
-                if st.button("Save Report", type="primary"):
-                    with st.spinner("Saving report..."):
-                        try:
-                            safe_kpis = _sanitize_for_json(analysis_data)
-                            rid = database.create_report(
-                                st.session_state['user_email'],
-                                f"Report - {selected_user} - {datetime.now():%Y-%m-%d}",
-                                safe_kpis,
-                                safe_kpis.get("ai_summary"),
-                            )
-                            st.session_state['last_saved_report_id'] = rid
-                            st.toast(f"Saved report #{rid}")
-                            st.success("Report saved. Find it under 'My Reports'.")
-                        except Exception as e:
-                            st.error("Save failed. Please ensure the database is reachable and you are logged in.")
-                            st.exception(e)
+            # Kept across reruns so the report buttons below keep the dashboard up
+            st.session_state['show_analysis'] = chat_hash
+        if st.session_state.get('show_analysis') == chat_hash:
+            render_dashboard(bundle)
 
 # AI Insights
 elif section == "AI Insights":
     st.header("AI Insights")
-    if uploaded_file is None:
+    if bundle is None:
         st.info("Upload a chat and return here for AI insights.")
     else:
         try:
-            sent_df = ai.analyze_sentiment(df, selected_user)
-            fig = ai.generate_sentiment_chart(sent_df)
-            if fig: st.plotly_chart(fig, use_container_width=True)
-            topics, _ = ai.extract_topics(df, selected_user, n_topics=3)
-            topic_fig = ai.generate_topic_chart(topics)
-            if topic_fig: st.plotly_chart(topic_fig, use_container_width=True)
-            summary_text = ai.generate_ai_summary(df, selected_user)
-            st.subheader("AI Summary"); st.write(summary_text)
-            st.caption("Sentiment polarity ranges from -1 (negative) to +1 (positive).")
+            pending = run_ai_jobs(df, chat_hash)
+            if pending:
+                wait_for_jobs(pending)
+            else:
+                sent_df = bundle.sentiment()
+                fig = ai.generate_sentiment_chart(sent_df)
+                if fig: st.plotly_chart(fig, use_container_width=True)
+                topics, _ = bundle.topics(3)
+                topic_fig = ai.generate_topic_chart(topics)
+                if topic_fig: st.plotly_chart(topic_fig, use_container_width=True)
+                st.subheader("AI Summary")
+                # The summary comes with the report KPIs, built by a background job
+                try:
+                    kpis, pending = report_kpis(bundle)
+                    if pending: wait_for_jobs(pending)
+                    else: st.write(kpis.get("ai_summary", "AI summary unavailable."))
+                except Exception: st.write("AI summary unavailable.")
+                st.caption("Sentiment polarity ranges from -1 (negative) to +1 (positive).")
         except Exception as e: st.error(f"AI analysis error: {e}")
 
 # My Reports
 elif section == "My Reports":
     st.header("My Reports")
     try:
-        rows = database.list_reports(st.session_state['user_email'])
+        # Keyset pages: cursors[i] is the (created_at, id) the i-th page starts after
+        cursors = st.session_state.setdefault('reports_cursors', [None])
+        rows, next_before = database.list_reports_page(st.session_state['user_email'], before=cursors[-1])
+        if not rows and len(cursors) > 1:
+            cursors.pop(); st.rerun()
         if not rows: st.info("No saved reports yet.")
         for r in rows:
 
@@ -344,6 +530,13 @@ elif section == "My Reports":
                     ok = database.delete_report(r['id'], st.session_state['user_email'])
                     if ok: st.success(f"Deleted #{r['id']}"); st.rerun()
                     else: st.error("Delete failed")
+        cN,cO = st.columns(2)
+        with cN:
+            if len(cursors) > 1 and st.button("← Newer"):
+                cursors.pop(); st.rerun()
+        with cO:
+            if next_before is not None and st.button("Older →"):
+                cursors.append(next_before); st.rerun()
         if 'report_view' in st.session_state:
             st.markdown("---")
             rec = st.session_state['report_view']
@@ -351,10 +544,23 @@ elif section == "My Reports":
             kpis = rec['kpi_json']
             for k,v in kpis.items(): st.write(f"- {k}: {v}")
             if rec.get('summary_text'): st.markdown("**AI Summary**"); st.write(rec['summary_text'])
-            pdf = rep.generate_pdf_report(kpis | {"ai_summary": rec.get("summary_text")}, rec['title'], 'N/A', {})
-            st.download_button("Download PDF", data=pdf.getvalue(), file_name=f"report_{rec['id']}.pdf", mime="application/pdf")
-            docx = rep.generate_docx_report(kpis | {"ai_summary": rec.get("summary_text")}, rec['title'], 'N/A', {})
-            st.download_button("Download DOCX", data=docx.getvalue(), file_name=f"report_{rec['id']}.docx", mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document")
+            dataset = load_report_dataset(rec)
+            if dataset is not None:
+                # Charts are rebuilt from the stored chat, no re-upload or re-parse
+                rbundle = get_bundle_cache().get(rec['dataset_hash'], kpis.get('selected_user', 'Overall'),
+                                                 dataset, kpis.get('export_format', 'N/A'))
+                with st.expander("📊 Charts", expanded=True): render_charts(rbundle)
+                saved = AnalysisBundle(None, rbundle.selected_user, rbundle.detected_format, f"report_{rec['id']}")
+                saved.seed('charts_data', rbundle.charts_data())
+            else:
+                saved = AnalysisBundle(None, rec['title'], 'N/A', f"report_{rec['id']}")
+                saved.seed('charts_data', {})
+            # Downloads use the KPIs as saved, so nothing is recomputed
+            saved.seed('analysis_data', kpis | {"ai_summary": rec.get("summary_text")})
+            pending = report_download(saved, "pdf", "PDF", file_name=f"report_{rec['id']}.pdf", mime="application/pdf")
+            pending += report_download(saved, "docx", "DOCX", file_name=f"report_{rec['id']}.docx",
+                                       mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document")
+            if pending: wait_for_jobs(pending)
     except Exception as e: st.error(f"Listing failed: {e}")
 
 # Profile
@@ -408,3 +614,26 @@ else:
     st.markdown("- Export WhatsApp chats as .txt without media.")
     st.markdown("- Use Analyze for charts; AI Insights for sentiment/topics.")
     st.markdown("- Save reports, then find them under My Reports.")
+
+def render_timing_panel(prof):
+    # The last TIMING_RUNS reruns are kept per session and exported together
+    runs = st.session_state.setdefault('timing_runs', [])
+    runs.append(prof.to_dict())
+    del runs[:-TIMING_RUNS]
+    with st.sidebar.expander(f"⏱️ Stage timings ({prof.seconds:.2f}s)", expanded=True):
+        if not prof.stages:
+            st.caption("Nothing was timed in this rerun.")
+        else:
+            st.dataframe(prof.totals(), use_container_width=True)
+            st.dataframe(prof.frame(), use_container_width=True, hide_index=True)
+        st.download_button("⬇️ Export timings (JSON)", data=json.dumps(runs, indent=2, default=str),
+                           file_name="stage_timings.json", mime="application/json")
+    with st.sidebar.expander("🗄️ Database pool"):
+        pool = db_pool.get_pool()
+        health = pool.health_check()
+        if health['ok']: st.success(f"Database reachable ({health['latency_ms']} ms)")
+        else: st.error(f"Database unreachable: {health['error']}")
+        st.json(pool.stats())
+
+if show_timings:
+    render_timing_panel(profiling.end_run())
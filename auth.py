@@ -1,40 +1,18 @@
 import bcrypt
 import psycopg2
-from psycopg2.extras import RealDictCursor
 from google_auth_oauthlib.flow import Flow
 
-DB_HOST = "localhost"
-DB_PORT = 5432
-DB_NAME = "whatsapp_analyzer"
-DB_USER = "kndn12"
-DB_PASSWORD = None
+import db_pool
+import migrations
+from profiling import profiled
 
 def get_db_connection():
-    conn = psycopg2.connect(
-        host=DB_HOST,
-        port=DB_PORT,
-        database=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD,
-        cursor_factory=RealDictCursor
-    )
-    return conn
+    # Pooled connection (see db_pool): committed on exit and returned to the pool
+    return db_pool.connection()
 
 def init_db():
-    conn = get_db_connection()
-    with conn:
-        with conn.cursor() as cur:
-            cur.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id SERIAL PRIMARY KEY,
-                email VARCHAR(255) UNIQUE NOT NULL,
-                hashed_password BYTEA,
-                name VARCHAR(255) NOT NULL,
-                google_id VARCHAR(255),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-            ''')
-    conn.close()
+    # The users table is created by migrations.py, with the rest of the schema
+    return migrations.ensure_schema()
 
 def hash_password(password: str) -> bytes:
     return bcrypt.hashpw(password.encode(), bcrypt.gensalt())
@@ -67,22 +45,20 @@ def create_flow():
     )
     return flow
 
+@profiled()
 def register_user(email: str, password: str, name: str):
-    conn = get_db_connection()
     hashed = hash_password(password)
     try:
-        with conn:
+        with get_db_connection() as conn:
             with conn.cursor() as cur:
                 cur.execute('INSERT INTO users (email, hashed_password, name) VALUES (%s, %s, %s)', (email, hashed, name))
         return True
     except psycopg2.errors.UniqueViolation:
         return False
-    finally:
-        conn.close()
 
+@profiled()
 def login_user(email: str, password: str):
-    conn = get_db_connection()
-    try:
+    with get_db_connection() as conn:
         with conn.cursor() as cur:
             cur.execute('SELECT hashed_password FROM users WHERE email = %s', (email,))
             user = cur.fetchone()
@@ -92,5 +68,3 @@ def login_user(email: str, password: str):
                 if check_password(password, hashed_password_bytes):
                     return True
         return False
-    finally:
-        conn.close()
@@ -0,0 +1,196 @@
+"""
+Headless batch analysis of a directory of WhatsApp exports.
+
+    python batch.py exports/ --out batch_out
+    python batch.py exports/ --out batch_out --workers 4 --reports pdf
+    python batch.py exports/ --out batch_out --reports none --profile
+
+Each export is parsed and analysed in a worker process, through the same
+preprocessor, AnalysisBundle and ReportGenerator the app uses, but without
+importing streamlit. KPIs of all exports are written to kpis.json and
+kpis.csv in the output directory, reports next to them, and the time spent
+in each stage is printed per export and in total.
+"""
+import argparse
+import contextlib
+import csv
+import glob
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import profiling
+
+STAGES = ['parse', 'stats', 'ai', 'charts', 'pdf', 'docx']
+REPORT_KINDS = ['pdf', 'docx']
+KPI_FIELDS = ['file', 'chat_hash', 'format', 'messages', 'users', 'total_messages', 'total_words',
+              'media_messages', 'links_shared', 'date_range', 'ai_summary', 'pdf', 'docx', 'profile', 'error']
+
+
+def find_exports(directory, pattern='*.txt', recursive=False):
+    """Export files under ``directory`` matching ``pattern``, sorted by path."""
+    path = os.path.join(directory, '**', pattern) if recursive else os.path.join(directory, pattern)
+    return sorted(p for p in glob.glob(path, recursive=recursive) if os.path.isfile(p))
+
+
+def _output_base(path, out_dir, root=None):
+    """
+    Output path of an export without extension: its path relative to
+    ``root`` mirrored under ``out_dir``, so a/chat.txt and b/chat.txt found
+    by a recursive search do not overwrite each other's reports.
+    """
+    rel = os.path.relpath(path, root) if root else os.path.basename(path)
+    base = os.path.join(out_dir, os.path.splitext(rel)[0])
+    os.makedirs(os.path.dirname(base), exist_ok=True)
+    return base
+
+
+@contextlib.contextmanager
+def _timed(timings, stage):
+    start = time.perf_counter()
+    try:
+        with profiling.stage(f"batch.{stage}"):
+            yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+
+def analyze_export(path, out_dir, reports=('pdf', 'docx'), profile=False, root=None):
+    """
+    Parse and analyse one export for the whole chat ("Overall"). Returns a
+    KPI row with a ``timings`` dict of seconds per stage; a failure is
+    recorded in ``error`` instead of raised, so one bad file does not stop
+    the batch. With ``profile`` the detailed stage timings of the pipeline
+    are written to ``<name>.profile.json``. Outputs keep the export's path
+    relative to ``root`` (the searched directory).
+    """
+    if profile:
+        with profiling.run(path) as prof:
+            row = analyze_export(path, out_dir, reports, root=root)
+        row['profile'] = f"{_output_base(path, out_dir, root)}.profile.json"
+        with open(row['profile'], 'w', encoding='utf-8') as f:
+            f.write(prof.to_json(indent=2))
+        return row
+
+    import chat_cache
+    import preprocessor
+    from analysis_bundle import AnalysisBundle
+    from sentiment import message_sentiment
+
+    row = {'file': path, 'timings': {}}
+    timings = row['timings']
+    try:
+        # The preprocessor reports progress with print(); keep the batch output readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            with _timed(timings, 'parse'):
+                with open(path, 'rb') as f:
+                    row['chat_hash'] = chat_cache.content_hash(f)
+                    f.seek(0)
+                    df = preprocessor.preprocess_file(f, compact=True)
+            detected_format = df.attrs.get('format', 'Unknown').split('_')[0]
+            row['format'] = detected_format
+            row['messages'] = len(df)
+            row['users'] = len(set(df['user'].astype(str).unique()) - {'group_notification'})
+
+            bundle = AnalysisBundle(df, 'Overall', detected_format, row['chat_hash'])
+            with _timed(timings, 'stats'):
+                bundle.stats()
+                bundle.date_range()
+            with _timed(timings, 'ai'):
+                # Already inside a worker process, so no nested pool
+                message_sentiment(df, workers=1)
+                row.update(bundle.analysis_data())
+            if reports:
+                with _timed(timings, 'charts'):
+                    bundle.charts_data()
+                from report_generator import ReportGenerator
+                generator = ReportGenerator()
+                for kind in reports:
+                    with _timed(timings, kind):
+                        data = bundle.pdf_report(generator) if kind == 'pdf' else bundle.docx_report(generator)
+                    row[kind] = f"{_output_base(path, out_dir, root)}.{kind}"
+                    with open(row[kind], 'wb') as f:
+                        f.write(data)
+    except Exception as e:
+        row['error'] = f"{type(e).__name__}: {e}"
+    return row
+
+
+def _format_timings(timings):
+    return ' '.join(f"{stage} {timings[stage]:6.2f}s" for stage in STAGES if stage in timings)
+
+
+def write_kpis(rows, out_dir):
+    """kpis.json (full rows, timings included) and kpis.csv (one flat row per export)."""
+    json_path = os.path.join(out_dir, 'kpis.json')
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(rows, f, indent=2, ensure_ascii=False, default=str)
+    csv_path = os.path.join(out_dir, 'kpis.csv')
+    with open(csv_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=KPI_FIELDS + [f"{s}_seconds" for s in STAGES], extrasaction='ignore')
+        writer.writeheader()
+        for row in rows:
+            flat = dict(row)
+            flat.update({f"{s}_seconds": round(t, 3) for s, t in row['timings'].items()})
+            writer.writerow(flat)
+    return json_path, csv_path
+
+
+def run_batch(directory, out_dir, workers=None, reports=('pdf', 'docx'), pattern='*.txt', recursive=False,
+              profile=False):
+    """Analyse every export in ``directory`` on a process pool; returns the KPI rows."""
+    paths = find_exports(directory, pattern, recursive)
+    if not paths:
+        print(f"No exports matching {pattern} in {directory}")
+        return []
+    os.makedirs(out_dir, exist_ok=True)
+    workers = min(workers or max(1, (os.cpu_count() or 2) - 1), len(paths))
+    print(f"Analysing {len(paths)} exports on {workers} workers")
+
+    start = time.perf_counter()
+    rows = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(analyze_export, p, out_dir, tuple(reports), profile, directory) for p in paths]
+        for future in as_completed(futures):
+            row = future.result()
+            rows.append(row)
+            name = os.path.relpath(row['file'], directory)
+            if row.get('error'):
+                print(f"❌ {name}: {row['error']}")
+            else:
+                print(f"✅ {name}: {row['messages']:,} messages | {_format_timings(row['timings'])}")
+    elapsed = time.perf_counter() - start
+
+    rows.sort(key=lambda r: r['file'])
+    json_path, csv_path = write_kpis(rows, out_dir)
+    print(f"\n{'stage':<8} {'total s':>9} {'mean s':>8} {'max s':>8}")
+    for stage in STAGES:
+        times = [r['timings'][stage] for r in rows if stage in r['timings']]
+        if times:
+            print(f"{stage:<8} {sum(times):9.2f} {sum(times) / len(times):8.2f} {max(times):8.2f}")
+    failed = sum(1 for r in rows if r.get('error'))
+    print(f"\n{len(rows) - failed}/{len(rows)} exports in {elapsed:.2f}s wall time; KPIs in {json_path} and {csv_path}")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyse a directory of WhatsApp exports without the web UI")
+    parser.add_argument('directory', help="directory with exported .txt chats")
+    parser.add_argument('--out', default='batch_out', help="output directory for KPIs and reports")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: CPUs - 1)")
+    parser.add_argument('--reports', nargs='+', choices=REPORT_KINDS + ['none'], default=REPORT_KINDS)
+    parser.add_argument('--pattern', default='*.txt', help="file name pattern of exports")
+    parser.add_argument('--recursive', action='store_true', help="also search subdirectories")
+    parser.add_argument('--profile', action='store_true', help="write detailed stage timings per export")
+    args = parser.parse_args()
+
+    reports = [] if 'none' in args.reports else args.reports
+    rows = run_batch(args.directory, args.out, args.workers, reports, args.pattern, args.recursive, args.profile)
+    sys.exit(1 if not rows or any(r.get('error') for r in rows) else 0)
+
+
+if __name__ == '__main__':
+    main()
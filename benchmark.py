@@ -0,0 +1,132 @@
+"""
+Synthetic-chat benchmarks for the preprocessing pipeline.
+
+    python benchmark.py preprocess --sizes 1 5 20
+    python benchmark.py memory --messages 1000000
+    python benchmark.py parallel --size 200 --workers 1 2 4 8
+"""
+import argparse
+import contextlib
+import io
+import random
+import time
+
+import preprocessor
+
+USERS = ['Alice', 'Bob Smith', '+91 98765 43210', 'Chandra', 'Dev']
+MESSAGES = [
+    'ok', 'haha', 'see you at 5', 'check https://example.com/page', '<Media omitted>',
+    'This message was deleted', 'long message\nthat continues\non several lines',
+    'lol 😂😂', 'meeting moved to tomorrow, same time', 'नमस्ते दोस्त',
+]
+
+
+def synthetic_chat(n_messages, kind='android', seed=42):
+    """Build a WhatsApp-style export with ``n_messages`` messages."""
+    rnd = random.Random(seed)
+    lines = []
+    for _ in range(n_messages):
+        d, m, y = rnd.randint(1, 28), rnd.randint(1, 12), rnd.choice([22, 23, 24])
+        h, mi, s = rnd.randint(0, 23), rnd.randint(0, 59), rnd.randint(0, 59)
+        user, text = rnd.choice(USERS), rnd.choice(MESSAGES)
+        if kind == 'ios':
+            ampm = 'AM' if h < 12 else 'PM'
+            lines.append(f"[{d:02d}/{m:02d}/{y}, {h % 12 or 12}:{mi:02d}:{s:02d} {ampm}] {user}: {text}")
+        else:
+            lines.append(f"{d:02d}/{m:02d}/{y}, {h:02d}:{mi:02d} - {user}: {text}")
+    return '\n'.join(lines) + '\n'
+
+
+def synthetic_chat_mb(size_mb, kind='android', seed=42):
+    """Build a synthetic export of roughly ``size_mb`` megabytes."""
+    sample = synthetic_chat(1000, kind, seed)
+    n = max(1, int(size_mb * 1024 * 1024 / len(sample.encode('utf-8')) * 1000))
+    return synthetic_chat(n, kind, seed)
+
+
+def bench_preprocess(sizes_mb=(1, 5, 20), kind='android', repeat=1):
+    """Time ``preprocess`` on growing exports and report throughput."""
+    print(f"{'size MB':>8} {'messages':>10} {'seconds':>9} {'MB/s':>8} {'msg/s':>10}")
+    results = []
+    for size_mb in sizes_mb:
+        data = synthetic_chat_mb(size_mb, kind)
+        actual_mb = len(data.encode('utf-8')) / (1024 * 1024)
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                df = preprocessor.preprocess(data)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results.append({'size_mb': actual_mb, 'messages': len(df), 'seconds': best})
+        print(f"{actual_mb:8.1f} {len(df):10,d} {best:9.2f} {actual_mb / best:8.1f} {len(df) / best:10,.0f}")
+    return results
+
+
+def memory_report(n_messages=1_000_000, kind='android'):
+    """Compare per-column memory of the default and compact chat layouts."""
+    data = synthetic_chat(n_messages, kind)
+    with contextlib.redirect_stdout(io.StringIO()):
+        df = preprocessor.preprocess(data)
+    del data
+    compact = preprocessor.compact_frame(df)
+
+    old = df.memory_usage(deep=True, index=False)
+    new = compact.memory_usage(deep=True, index=False)
+    mb = 1024 * 1024
+    print(f"{len(df):,} messages")
+    print(f"{'column':<10} {'old dtype':<16} {'old MB':>8} {'new dtype':<16} {'new MB':>8}")
+    for col in df.columns:
+        print(f"{col:<10} {str(df[col].dtype):<16} {old[col] / mb:8.1f} "
+              f"{str(compact[col].dtype):<16} {new[col] / mb:8.1f}")
+    print(f"{'total':<10} {'':<16} {old.sum() / mb:8.1f} {'':<16} {new.sum() / mb:8.1f} "
+          f"({new.sum() / old.sum():.0%})")
+    return old, new
+
+
+def bench_parallel(size_mb=100, workers=(1, 2, 4, 8), kind='android'):
+    """Speed-up of ``preprocess_parallel`` over the serial path by worker count."""
+    data = synthetic_chat_mb(size_mb, kind)
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        preprocessor.preprocess(data)
+        serial = time.perf_counter() - start
+    print(f"serial: {serial:.2f}s")
+    print(f"{'workers':>8} {'seconds':>9} {'speed-up':>9}")
+    results = []
+    for n in workers:
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            preprocessor.preprocess_parallel(data, workers=n)
+            elapsed = time.perf_counter() - start
+        results.append({'workers': n, 'seconds': elapsed, 'speedup': serial / elapsed})
+        print(f"{n:8d} {elapsed:9.2f} {serial / elapsed:8.2f}x")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WhatsApp analyzer benchmarks")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('preprocess', help="throughput of preprocess() vs file size")
+    p.add_argument('--sizes', type=float, nargs='+', default=[1, 5, 20], help="export sizes in MB")
+    p.add_argument('--kind', choices=['android', 'ios'], default='android')
+    p.add_argument('--repeat', type=int, default=1)
+    p = sub.add_parser('memory', help="memory of default vs compact DataFrame layout")
+    p.add_argument('--messages', type=int, default=1_000_000)
+    p.add_argument('--kind', choices=['android', 'ios'], default='android')
+    p = sub.add_parser('parallel', help="preprocess_parallel speed-up vs worker count")
+    p.add_argument('--size', type=float, default=100, help="export size in MB")
+    p.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    p.add_argument('--kind', choices=['android', 'ios'], default='android')
+    args = parser.parse_args()
+
+    if args.command == 'preprocess':
+        bench_preprocess(args.sizes, args.kind, args.repeat)
+    elif args.command == 'memory':
+        memory_report(args.messages, args.kind)
+    elif args.command == 'parallel':
+        bench_parallel(args.size, args.workers, args.kind)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+# Bump whenever preprocess() output changes so stale on-disk frames are ignored
+CACHE_VERSION = 2
+HASH_CHUNK = 1024 * 1024
+
+# Parsed chats linked from saved reports; never pruned, unlike the cache dir
+DATASET_DIR = os.getenv('CHAT_DATASET_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'datasets')
+
+
+def content_hash(source, length=None):
+    """
+    SHA-256 of an upload (bytes, str or file object), read in chunks. With
+    ``length`` only the first ``length`` bytes (characters for text) are hashed.
+    """
+    h = hashlib.sha256()
+    if isinstance(source, str):
+        source = source.encode('utf-8')
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        h.update(source[:length])
+        return h.hexdigest()
+
+    pos = source.tell()
+    source.seek(0)
+    remaining = length
+    while remaining is None or remaining > 0:
+        chunk = source.read(HASH_CHUNK if remaining is None else min(HASH_CHUNK, remaining))
+        if not chunk:
+            break
+        if remaining is not None:
+            remaining -= len(chunk)
+        h.update(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+    source.seek(pos)
+    return h.hexdigest()
+
+
+def dataset_path(key, dataset_dir=None):
+    return os.path.join(dataset_dir or DATASET_DIR, f"{key}.v{CACHE_VERSION}.parquet")
+
+
+def save_dataset(key, df, dataset_dir=None):
+    """
+    Store a parsed chat as a zstd Parquet dataset named by its content hash
+    and return the path. A chat already stored is not written again.
+    """
+    path = dataset_path(key, dataset_dir)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        df.to_parquet(path + '.tmp', compression='zstd')
+        os.replace(path + '.tmp', path)
+    return path
+
+
+def load_dataset(path):
+    """Read a stored chat back, memory-mapping the file instead of copying it in."""
+    return pd.read_parquet(path, memory_map=True)
+
+
+class ChatCache:
+    """
+    Parsed chat DataFrames keyed by the hash of the uploaded file.
+
+    Frames live in an in-memory LRU bounded by entry count and by their deep
+    memory size. With ``disk_dir`` set, every parsed frame is also written as
+    Parquet (requires pyarrow), so a memory miss reloads it instead of
+    re-parsing; the directory is pruned oldest-first past ``max_disk_bytes``.
+    """
+
+    def __init__(self, max_bytes=512 * 1024 * 1024, max_entries=8, disk_dir=None,
+                 max_disk_bytes=2 * 1024 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._frames = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = self.disk_hits = self.misses = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @classmethod
+    def from_env(cls):
+        """Build a cache from CHAT_CACHE_* environment variables."""
+        mb = 1024 * 1024
+        return cls(
+            max_bytes=int(os.getenv('CHAT_CACHE_MAX_MB', '512')) * mb,
+            max_entries=int(os.getenv('CHAT_CACHE_MAX_ENTRIES', '8')),
+            disk_dir=os.getenv('CHAT_CACHE_DIR') or None,
+            max_disk_bytes=int(os.getenv('CHAT_CACHE_DISK_MAX_MB', '2048')) * mb,
+        )
+
+    def _path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.v{CACHE_VERSION}.parquet")
+
+    def get(self, key):
+        with self._lock:
+            df = self._frames.get(key)
+            if df is not None:
+                self._frames.move_to_end(key)
+                self.hits += 1
+                return df
+
+        df = self._read_disk(key)
+        if df is not None:
+            self.disk_hits += 1
+            self._remember(key, df)
+            return df
+        self.misses += 1
+        return None
+
+    def put(self, key, df):
+        self._remember(key, df)
+        self._write_disk(key, df)
+
+    def get_or_parse(self, key, parse):
+        """
+        Return the cached frame for ``key``, calling ``parse()`` only on a miss.
+        ``parse()`` may return None while the frame is not ready yet; nothing
+        is cached then and None is returned.
+        """
+        df = self.get(key)
+        if df is None:
+            df = parse()
+            if df is not None:
+                self.put(key, df)
+        return df
+
+    def _remember(self, key, df):
+        size = int(df.memory_usage(deep=True).sum())
+        with self._lock:
+            if key in self._frames:
+                self.total_bytes -= self._sizes.pop(key)
+                del self._frames[key]
+            self._frames[key] = df
+            self._sizes[key] = size
+            self.total_bytes += size
+            # Evict least recently used, but always keep the newest frame
+            while len(self._frames) > 1 and (len(self._frames) > self.max_entries
+                                             or self.total_bytes > self.max_bytes):
+                old_key, _ = self._frames.popitem(last=False)
+                self.total_bytes -= self._sizes.pop(old_key)
+
+    def _read_disk(self, key):
+        if not self.disk_dir or not os.path.exists(self._path(key)):
+            return None
+        try:
+            df = pd.read_parquet(self._path(key))
+            os.utime(self._path(key))
+            return df
+        except Exception as e:
+            print(f"⚠️  Could not read cached chat {key[:12]}: {e}")
+            return None
+
+    def _write_disk(self, key, df):
+        if not self.disk_dir:
+            return
+        path = self._path(key)
+        try:
+            df.to_parquet(path + '.tmp', compression='zstd')
+            os.replace(path + '.tmp', path)
+        except Exception as e:
+            print(f"⚠️  Could not write cached chat {key[:12]}: {e}")
+            return
+        self._prune_disk()
+
+    def _prune_disk(self):
+        entries = []
+        for name in os.listdir(self.disk_dir):
+            if name.endswith('.parquet'):
+                path = os.path.join(self.disk_dir, name)
+                st = os.stat(path)
+                entries.append((st.st_mtime, st.st_size, path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries[:-1]:
+            if total <= self.max_disk_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._frames),
+                'memory_mb': round(self.total_bytes / (1024 * 1024), 1),
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+            }
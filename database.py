@@ -1,65 +1,103 @@
 import json
+import threading
+import time
+from collections import OrderedDict
 import psycopg2
-from psycopg2.extras import RealDictCursor
 import bcrypt
 
-# ADJUST for local Postgres
-DB_HOST = "localhost"
-DB_PORT = 5432
-DB_NAME = "whatsapp_analyzer"
-DB_USER = "kndn12"   # <- change to your PG user
-DB_PASSWORD = None   # None for peer-auth local
+import db_pool
+import migrations
+from profiling import profiled
 
 def _conn():
-    return psycopg2.connect(
-        host=DB_HOST, port=DB_PORT, database=DB_NAME,
-        user=DB_USER, password=DB_PASSWORD, cursor_factory=RealDictCursor
-    )
+    # Pooled connection (see db_pool): committed on exit and returned to the pool
+    return db_pool.connection()
+
+REPORTS_PAGE_SIZE = 20
+REPORTS_CACHE_TTL = 30.0   # seconds a user's listing pages are reused
+REPORTS_CACHE_PAGES = 8    # most recently cached pages kept per user
+
+# user_email -> OrderedDict{(before, limit): (expires at, page)}; dropped on
+# create/delete, expired pages are pruned whenever the cache is touched
+_reports_cache = {}
+_reports_lock = threading.Lock()
+
+def _invalidate_reports(user_email: str):
+    with _reports_lock:
+        _reports_cache.pop(user_email, None)
+
+def _prune_reports(now: float):
+    # Caller holds _reports_lock
+    for user_email in list(_reports_cache):
+        pages = _reports_cache[user_email]
+        for key in [k for k, (expires, _) in pages.items() if expires <= now]:
+            del pages[key]
+        if not pages:
+            del _reports_cache[user_email]
 
 def init_schema():
-    with _conn() as conn, conn.cursor() as cur:
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id SERIAL PRIMARY KEY,
-            email VARCHAR(255) UNIQUE NOT NULL,
-            hashed_password BYTEA,
-            name VARCHAR(255) NOT NULL,
-            google_id VARCHAR(255),
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-        """)
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS reports (
-            id SERIAL PRIMARY KEY,
-            user_email VARCHAR(255) NOT NULL REFERENCES users(email) ON DELETE CASCADE,
-            title VARCHAR(255) NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            kpi_json JSONB NOT NULL,
-            summary_text TEXT,
-            pdf_path TEXT,
-            docx_path TEXT
-        );
-        """)
-
-def create_report(user_email: str, title: str, kpis: dict, summary_text: str | None = None) -> int:
+    # Versioned DDL lives in migrations.py; applied once per process
+    return migrations.ensure_schema()
+
+@profiled()
+def create_report(user_email: str, title: str, kpis: dict, summary_text: str | None = None,
+                  dataset_path: str | None = None, dataset_hash: str | None = None) -> int:
     with _conn() as conn, conn.cursor() as cur:
         cur.execute(
-            "INSERT INTO reports (user_email,title,kpi_json,summary_text) VALUES (%s,%s,%s,%s) RETURNING id",
-            (user_email, title, json.dumps(kpis), summary_text),
+            "INSERT INTO reports (user_email,title,kpi_json,summary_text,dataset_path,dataset_hash) "
+            "VALUES (%s,%s,%s,%s,%s,%s) RETURNING id",
+            (user_email, title, json.dumps(kpis), summary_text, dataset_path, dataset_hash),
         )
-        return cur.fetchone()["id"]
+        rid = cur.fetchone()["id"]
+    _invalidate_reports(user_email)
+    return rid
 
-def list_reports(user_email: str):
+@profiled()
+def list_reports_page(user_email: str, before: tuple | None = None, limit: int = REPORTS_PAGE_SIZE):
+    """
+    One page of a user's reports, newest first, as (rows, next_before).
+    ``before`` is the (created_at, id) of the last row of the previous page;
+    next_before is None on the last page. Pages are cached for a few seconds.
+    """
+    key = (before, limit)
+    now = time.monotonic()
+    with _reports_lock:
+        _prune_reports(now)
+        hit = _reports_cache.get(user_email, {}).get(key)
+        if hit:
+            return hit[1]
     with _conn() as conn, conn.cursor() as cur:
-        cur.execute(
-            "SELECT id,title,created_at FROM reports WHERE user_email=%s ORDER BY created_at DESC",
-            (user_email,),
-        )
-        return cur.fetchall()
+        # Keyset on (created_at, id), served by idx_reports_user_created
+        if before is None:
+            cur.execute(
+                "SELECT id,title,created_at FROM reports WHERE user_email=%s "
+                "ORDER BY created_at DESC, id DESC LIMIT %s",
+                (user_email, limit + 1),
+            )
+        else:
+            cur.execute(
+                "SELECT id,title,created_at FROM reports WHERE user_email=%s AND (created_at, id) < (%s, %s) "
+                "ORDER BY created_at DESC, id DESC LIMIT %s",
+                (user_email, before[0], before[1], limit + 1),
+            )
+        rows = cur.fetchall()
+    next_before = (rows[limit - 1]["created_at"], rows[limit - 1]["id"]) if len(rows) > limit else None
+    page = (rows[:limit], next_before)
+    with _reports_lock:
+        pages = _reports_cache.setdefault(user_email, OrderedDict())
+        pages[key] = (now + REPORTS_CACHE_TTL, page)
+        pages.move_to_end(key)
+        while len(pages) > REPORTS_CACHE_PAGES:
+            pages.popitem(last=False)
+    return page
 
+@profiled()
 def get_report(report_id: int):
     with _conn() as conn, conn.cursor() as cur:
-        cur.execute("SELECT * FROM reports WHERE id=%s", (report_id,))
+        cur.execute(
+            "SELECT id,user_email,title,created_at,kpi_json,summary_text,dataset_path,dataset_hash FROM reports WHERE id=%s",
+            (report_id,),
+        )
         row = cur.fetchone()
         if not row:
             return None
@@ -72,32 +110,40 @@ def get_report(report_id: int):
                 pass
         return row
 
+@profiled()
 def user_exists(email: str) -> bool:
     with _conn() as conn, conn.cursor() as cur:
         cur.execute("SELECT 1 FROM users WHERE email=%s", (email,))
         return cur.fetchone() is not None
 
+@profiled()
 def get_user(email: str):
     with _conn() as conn, conn.cursor() as cur:
         cur.execute("SELECT email,name,created_at FROM users WHERE email=%s", (email,))
         return cur.fetchone()
 
+@profiled()
 def update_user_name(email: str, new_name: str) -> bool:
     with _conn() as conn, conn.cursor() as cur:
         cur.execute("UPDATE users SET name=%s WHERE email=%s", (new_name, email))
         return cur.rowcount > 0
 
+@profiled()
 def change_user_password(email: str, new_password: str) -> bool:
     hashed = bcrypt.hashpw(new_password.encode(), bcrypt.gensalt())
     with _conn() as conn, conn.cursor() as cur:
         cur.execute("UPDATE users SET hashed_password=%s WHERE email=%s", (psycopg2.Binary(hashed), email))
         return cur.rowcount > 0
 
+@profiled()
 def delete_report(report_id: int, user_email: str) -> bool:
     with _conn() as conn, conn.cursor() as cur:
         cur.execute("DELETE FROM reports WHERE id=%s AND user_email=%s", (report_id, user_email))
-        return cur.rowcount > 0
+        deleted = cur.rowcount > 0
+    _invalidate_reports(user_email)
+    return deleted
 
+@profiled()
 def count_reports(email: str) -> int:
     with _conn() as conn, conn.cursor() as cur:
         cur.execute("SELECT COUNT(*) AS c FROM reports WHERE user_email=%s", (email,))
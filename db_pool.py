@@ -0,0 +1,302 @@
+"""
+Shared, thread-safe database connection pool.
+
+``ConnectionPool`` works with any DB-API connection factory, so it runs
+against psycopg2 in the app and sqlite3 in a quick local check. The process
+wide pool used by database.py and auth.py is built by ``get_pool()`` from
+the ``db_pool`` section of config.json and the DB_* environment variables.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Defaults for local Postgres, overridden by DB_* environment variables
+DB_HOST = "localhost"
+DB_PORT = 5432
+DB_NAME = "whatsapp_analyzer"
+DB_USER = "kndn12"   # <- change to your PG user
+DB_PASSWORD = None   # None for peer-auth local
+DB_CONNECT_TIMEOUT = 5   # seconds; an unreachable database fails fast instead of stalling reruns
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json")
+
+POOL_DEFAULTS = {
+    "min_size": 1,
+    "max_size": 10,
+    "timeout": 30.0,
+    "max_idle_seconds": 300.0,
+    "max_lifetime_seconds": 3600.0,
+    "health_check_interval": 30.0,
+}
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """
+    Up to ``max_size`` connections made by ``connect()``.
+
+    Idle connections are reused most recently used first. One that has sat
+    idle for ``health_check_interval`` seconds is pinged before it is handed
+    out, and connections past ``max_idle_seconds`` idle or
+    ``max_lifetime_seconds`` old are closed instead of reused. ``acquire``
+    waits up to ``timeout`` seconds for a free slot, then raises PoolTimeout.
+    """
+
+    def __init__(self, connect, min_size=1, max_size=10, timeout=30.0, max_idle_seconds=300.0,
+                 max_lifetime_seconds=3600.0, health_check_interval=30.0, ping="SELECT 1"):
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle_seconds = max_idle_seconds
+        self.max_lifetime_seconds = max_lifetime_seconds
+        self.health_check_interval = health_check_interval
+        self.ping = ping
+        self._idle = []          # (connection, released at)
+        self._born = {}          # id(connection) -> created at
+        self._in_use = 0
+        self._cond = threading.Condition()
+        self._counts = dict(created=0, closed=0, acquired=0, waited=0, timeouts=0, failed_checks=0)
+        self._wait_seconds = 0.0
+
+    @property
+    def size(self):
+        return len(self._idle) + self._in_use
+
+    def _open(self):
+        conn = self._connect()
+        with self._cond:
+            self._born[id(conn)] = time.monotonic()
+            self._counts["created"] += 1
+        return conn
+
+    def _close(self, conn):
+        self._born.pop(id(conn), None)
+        self._counts["closed"] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _healthy(self, conn):
+        if getattr(conn, "closed", 0):
+            return False
+        cur = None
+        try:
+            cur = conn.cursor()
+            cur.execute(self.ping)
+            cur.fetchall()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+        finally:
+            try:
+                if cur is not None: cur.close()
+            except Exception:
+                pass
+
+    def _usable(self, conn, released, now):
+        # Runs without the lock: the ping is a database round trip
+        with self._cond:
+            born = self._born.get(id(conn), now)
+        if now - born > self.max_lifetime_seconds:
+            return False
+        if now - released > self.max_idle_seconds:
+            return False
+        if now - released > self.health_check_interval and not self._healthy(conn):
+            with self._cond:
+                self._counts["failed_checks"] += 1
+            return False
+        return True
+
+    def acquire(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        while True:
+            with self._cond:
+                while not self._idle and self._in_use >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._counts["timeouts"] += 1
+                        raise PoolTimeout(f"No database connection free after {timeout:g}s "
+                                          f"({self.max_size} in use)")
+                    self._counts["waited"] += 1
+                    self._cond.wait(remaining)
+                # Reserve the slot, then check or connect outside the lock
+                idle = self._idle.pop() if self._idle else None
+                self._in_use += 1
+            if idle is None:
+                break
+            conn, released = idle
+            if self._usable(conn, released, time.monotonic()):
+                return self._checked_out(conn, start)
+            with self._cond:
+                self._close(conn)
+                self._in_use -= 1
+                self._cond.notify()
+        try:
+            conn = self._open()
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return self._checked_out(conn, start)
+
+    def _checked_out(self, conn, start):
+        with self._cond:
+            self._counts["acquired"] += 1
+            self._wait_seconds += time.monotonic() - start
+        return conn
+
+    def release(self, conn, broken=False):
+        """Return a connection; a broken or closed one is discarded."""
+        if not broken:
+            try:
+                conn.rollback()   # never hand out an open transaction
+            except Exception:
+                broken = True
+        with self._cond:
+            self._in_use -= 1
+            if broken or getattr(conn, "closed", 0):
+                self._close(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """A pooled connection, committed on success and rolled back on error."""
+        conn = self.acquire(timeout)
+        broken = False
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                broken = True
+            raise
+        finally:
+            self.release(conn, broken)
+
+    def warm(self):
+        """Open connections up to ``min_size``."""
+        with self._cond:
+            missing = self.min_size - self.size
+        conns = [self.acquire() for _ in range(max(0, missing))]
+        for conn in conns:
+            self.release(conn)
+
+    def health_check(self, timeout=5.0):
+        """
+        Ping the database through the pool: {'ok', 'latency_ms', 'error'}.
+        Waits at most ``timeout`` seconds for a connection, not the pool timeout.
+        """
+        start = time.monotonic()
+        try:
+            conn = self.acquire(timeout)
+        except Exception as e:
+            return {"ok": False, "latency_ms": None, "error": str(e)}
+        ok = self._healthy(conn)
+        if not ok:
+            with self._cond:
+                self._counts["failed_checks"] += 1
+        self.release(conn, broken=not ok)
+        return {"ok": ok, "latency_ms": round((time.monotonic() - start) * 1000, 1),
+                "error": None if ok else "ping failed"}
+
+    def stats(self):
+        with self._cond:
+            acquired = self._counts["acquired"]
+            return {
+                "size": self.size,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "max_size": self.max_size,
+                **self._counts,
+                "avg_wait_ms": round(self._wait_seconds / acquired * 1000, 2) if acquired else 0.0,
+            }
+
+    def close(self):
+        with self._cond:
+            while self._idle:
+                self._close(self._idle.pop()[0])
+
+
+def _config_section(name):
+    try:
+        with open(CONFIG_FILE, "r", encoding="utf-8") as f:
+            return json.load(f).get(name) or {}
+    except (OSError, ValueError):
+        return {}
+
+
+def pool_settings():
+    """Pool sizing: POOL_DEFAULTS, then config.json's db_pool, then DB_POOL_* env vars."""
+    settings = dict(POOL_DEFAULTS)
+    settings.update({k: v for k, v in _config_section("db_pool").items() if k in POOL_DEFAULTS})
+    for key, default in POOL_DEFAULTS.items():
+        env = os.getenv(f"DB_POOL_{key.upper()}")
+        if env:
+            settings[key] = type(default)(env)
+    return settings
+
+
+def connection_settings():
+    return {
+        "host": os.getenv("DB_HOST") or DB_HOST,
+        "port": int(os.getenv("DB_PORT") or DB_PORT),
+        "database": os.getenv("DB_NAME") or DB_NAME,
+        "user": os.getenv("DB_USER") or DB_USER,
+        "password": os.getenv("DB_PASSWORD") or DB_PASSWORD,
+        "connect_timeout": int(os.getenv("DB_CONNECT_TIMEOUT") or DB_CONNECT_TIMEOUT),
+    }
+
+
+def postgres_connect(**params):
+    import psycopg2
+    from psycopg2.extras import RealDictCursor
+    return lambda: psycopg2.connect(cursor_factory=RealDictCursor, **params)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """The process-wide Postgres pool, created on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            return _pool
+        pool = _pool = ConnectionPool(postgres_connect(**connection_settings()), **pool_settings())
+    # Warmed outside the lock, so other callers use the pool (and its
+    # timeouts) instead of queueing behind the first connects
+    try:
+        pool.warm()
+    except Exception as e:
+        # Connections are retried on first use; startup should not fail here
+        print(f"⚠️  Could not open {pool.min_size} database connection(s): {e}")
+    return pool
+
+
+def set_pool(pool):
+    """Swap the process-wide pool (another database, or a stand-in for checks)."""
+    global _pool
+    with _pool_lock:
+        old, _pool = _pool, pool
+    if old is not None and old is not pool:
+        old.close()
+
+
+def connection(timeout=None):
+    return get_pool().connection(timeout)
@@ -0,0 +1,111 @@
+"""
+Emoji extraction over the full Unicode emoji set.
+
+A trie built once from ``emoji.EMOJI_DATA`` is matched greedily, so ZWJ
+sequences (👨‍👩‍👧), skin-tone variants (👍🏽), flags and keycaps are counted as
+one emoji each, and every occurrence is counted. Unqualified spellings are
+reported in their fully-qualified form (❤ -> ❤️).
+"""
+import re
+from collections import Counter
+
+import emoji
+
+_END = None
+_trie = None
+_start_re = None
+
+# Messages without any non-ASCII character cannot contain an emoji
+_CANDIDATE = re.compile(r'[^\x00-\x7f]')
+
+
+def _strip_vs(seq):
+    return seq.replace('\ufe0f', '')
+
+
+def _build():
+    global _trie, _start_re
+    status = emoji.STATUS
+    canonical = {_strip_vs(e): e for e, data in emoji.EMOJI_DATA.items()
+                 if data.get('status') == status['fully_qualified']}
+    root = {}
+    for e, data in emoji.EMOJI_DATA.items():
+        if data.get('status') == status['component']:
+            name = ''   # skin tones / hair parts on their own are not counted
+        elif data.get('status') != status['fully_qualified'] and len(e) == 1 and ord(e) < 0x2600:
+            name = ''   # ©, ™, ↔ ... without VS16 are text symbols
+        else:
+            name = canonical.get(_strip_vs(e), e)
+        node = root
+        for ch in e:
+            node = node.setdefault(ch, {})
+        node[_END] = name
+    _start_re = re.compile('[' + ''.join(re.escape(ch) for ch in root) + ']')
+    _trie = root
+
+
+def extract_emojis(text):
+    """Every emoji in ``text``, in order, longest sequence first."""
+    if _trie is None:
+        _build()
+    found = []
+    pos, n = 0, len(text)
+    while True:
+        m = _start_re.search(text, pos)
+        if m is None:
+            break
+        i = j = m.start()
+        node, match = _trie, None
+        while j < n:
+            node = node.get(text[j])
+            if node is None:
+                break
+            j += 1
+            if _END in node:
+                match = (j, node[_END])
+        if match is None:
+            pos = i + 1
+            continue
+        pos, name = match
+        if name:
+            found.append(name)
+    return found
+
+
+class EmojiCounts:
+    """
+    Emoji counts per user for a whole chat. Only messages with a non-ASCII
+    character are scanned, and each distinct message text is scanned once.
+    """
+
+    def __init__(self, df):
+        messages = df['message'].astype(str)
+        rows = ~messages.str.startswith('<') & messages.str.contains(_CANDIDATE, na=False)
+        pairs = df.loc[rows, ['user', 'message']].groupby(['user', 'message'], observed=True, sort=False).size()
+
+        scanned = {}
+        self.by_user = {}
+        self.overall = Counter()
+        for (user, message), n in pairs.items():
+            counts = scanned.get(message)
+            if counts is None:
+                counts = scanned[message] = Counter(extract_emojis(message))
+            if not counts:
+                continue
+            user_counts = self.by_user.setdefault(user, Counter())
+            for e, k in counts.items():
+                user_counts[e] += k * n
+                self.overall[e] += k * n
+
+    def counts(self, selected_user):
+        if selected_user == 'Overall':
+            return self.overall
+        return self.by_user.get(selected_user, Counter())
+
+    def merge(self, other):
+        """Emoji counts of this chat followed by ``other``'s newer messages."""
+        merged = EmojiCounts.__new__(EmojiCounts)
+        merged.overall = self.overall + other.overall
+        merged.by_user = {user: self.by_user.get(user, Counter()) + other.by_user.get(user, Counter())
+                          for user in self.by_user.keys() | other.by_user.keys()}
+        return merged
@@ -0,0 +1,63 @@
+"""
+Memo of data derived from a parsed chat DataFrame (aggregates, indexes,
+token counts). Parsed frames are reused across reruns (see chat_cache), so
+anything built from one is computed once and dropped when the frame is freed.
+"""
+import threading
+import weakref
+
+_store = {}
+_lock = threading.Lock()
+
+
+def _entry(df):
+    key = id(df)
+    entry = _store.get(key)
+    if entry is None:
+        entry = _store[key] = {}
+        weakref.finalize(df, _store.pop, key, None)
+    return entry
+
+
+def derived(df, name, build):
+    """Return ``build(df)``, computed at most once per frame and ``name``."""
+    with _lock:
+        entry = _entry(df)
+        if name in entry:
+            return entry[name]
+    value = build(df)
+    with _lock:
+        entry[name] = value
+    return value
+
+
+def has(df, name):
+    with _lock:
+        return name in _store.get(id(df), ())
+
+
+def entries(df):
+    """Everything derived so far from ``df``, as a name -> value dict."""
+    with _lock:
+        return dict(_store.get(id(df), {}))
+
+
+def seed(df, name, value):
+    """Store a value for ``name`` computed elsewhere (another process, a merge)."""
+    with _lock:
+        _entry(df)[name] = value
+
+
+def user_rows(df):
+    """Row positions of every user's messages, built once per frame."""
+    return derived(df, 'user_rows', lambda d: d.groupby('user', observed=True).indices)
+
+
+def user_frame(df, selected_user):
+    """Messages of ``selected_user`` ('Overall' means the whole chat)."""
+    if selected_user == 'Overall':
+        return df
+    rows = user_rows(df).get(selected_user)
+    if rows is None:
+        return df.iloc[0:0]
+    return df.take(rows)
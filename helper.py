@@ -1,11 +1,98 @@
-from urlextract import URLExtract
 from wordcloud import WordCloud
 import pandas as pd
 from collections import Counter
-import emoji
+import os
 import re
+from functools import lru_cache
+import numpy as np
 
-extract = URLExtract()
+import frame_cache
+from emoji_extractor import EmojiCounts
+import preprocessor
+from profiling import profiled
+
+def _present(counts):
+    # value_counts on a categorical column also lists categories with no rows
+    return counts[counts > 0]
+
+class ActivityCube:
+    """
+    Message counts over (user, date, hour) with calendar columns, built in one
+    groupby. Timelines, activity maps and the heatmap are sliced from it, and
+    'Overall' is the sum over users.
+    """
+
+    def __init__(self, df=None, counts=None):
+        if counts is None:
+            counts = df.groupby(['user', 'only_date', 'hour'], observed=True).size()
+        self.counts = counts
+        cube = self._with_calendar(counts.rename('count').reset_index())
+        self.by_user = {user: part.reset_index(drop=True)
+                        for user, part in cube.groupby('user', observed=True)}
+        overall = cube.groupby(['only_date', 'hour'])['count'].sum().reset_index()
+        self.overall = self._with_calendar(overall)
+        self.user_totals = cube.groupby('user', observed=True)['count'].sum().rename_axis('user')
+
+    @staticmethod
+    def _with_calendar(cube):
+        day = pd.to_datetime(cube['only_date'])
+        cube['year'] = day.dt.year
+        cube['month_num'] = day.dt.month
+        cube['month'] = pd.Categorical(day.dt.month_name(), categories=preprocessor.MONTH_NAMES)
+        cube['day_name'] = pd.Categorical(day.dt.day_name(), categories=preprocessor.DAY_NAMES)
+        cube['period'] = pd.Categorical(np.array(preprocessor.PERIODS)[cube['hour'].to_numpy(dtype=int)],
+                                        categories=preprocessor.PERIODS)
+        return cube
+
+    def slice(self, selected_user):
+        if selected_user == 'Overall':
+            return self.overall
+        return self.by_user.get(selected_user, self.overall.iloc[0:0])
+
+    def merge(self, other):
+        """The cube of this chat followed by ``other``, the cube of its newer messages."""
+        parts = [c.rename('count').reset_index() for c in (self.counts, other.counts)]
+        for part in parts:
+            part['user'] = part['user'].astype(str)
+        counts = pd.concat(parts).groupby(['user', 'only_date', 'hour'])['count'].sum()
+        return ActivityCube(counts=counts)
+
+def _add_counts(a, b):
+    # Per-user totals of two frames whose user categories may differ
+    totals = pd.concat([a, b])
+    totals.index = totals.index.astype(str)
+    return totals.groupby(level=0).sum()
+
+@profiled()
+def activity_cube(df):
+    """The ActivityCube of a parsed chat, built once per frame."""
+    return frame_cache.derived(df, 'activity_cube', ActivityCube)
+
+def date_range(df):
+    """First and last day of the chat as dates, for object or datetime64 ``only_date``."""
+    return pd.Timestamp(df['only_date'].min()).date(), pd.Timestamp(df['only_date'].max()).date()
+
+STOP_WORDS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stop_hinglish.txt')
+
+@lru_cache(maxsize=1)
+def load_stop_words():
+    try:
+        with open(STOP_WORDS_FILE, 'r', encoding='utf-8') as f:
+            return frozenset(f.read().lower().split())
+    except FileNotFoundError:
+        return frozenset(['the', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by'])
+
+URL_RE = re.compile(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+')
+EMAIL_RE = re.compile(r'\S+@\S+')
+PHONE_RE = re.compile(r'\+?\d{10,15}')
+
+# Special tokens and system message fragments
+SPECIAL_TOKENS = frozenset([
+    '<media', 'omitted>', '<this', '<message', '<deleted>', 
+    '<image', '<video', '<audio', '<document', '<sticker',
+    '<gif', '<voice', '<contact', 'message', 'was', 'deleted',
+    'this', 'omitted', 'note'
+])
 
 def advanced_word_filter(text, stop_words):
     """
@@ -15,14 +102,10 @@ def advanced_word_filter(text, stop_words):
     # Convert to lowercase
     text = str(text).lower()
     
-    # Remove URLs
-    text = re.sub(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', '', text)
-    
-    # Remove email addresses
-    text = re.sub(r'\S+@\S+', '', text)
-    
-    # Remove phone numbers
-    text = re.sub(r'\+?\d{10,15}', '', text)
+    # Remove URLs, email addresses and phone numbers
+    text = URL_RE.sub('', text)
+    text = EMAIL_RE.sub('', text)
+    text = PHONE_RE.sub('', text)
     
     # Split into words
     words = text.split()
@@ -37,13 +120,7 @@ def advanced_word_filter(text, stop_words):
             continue
             
         # Remove special tokens and system messages
-        special_tokens = [
-            '<media', 'omitted>', '<this', '<message', '<deleted>', 
-            '<image', '<video', '<audio', '<document', '<sticker',
-            '<gif', '<voice', '<contact', 'message', 'was', 'deleted',
-            'this', 'omitted', 'note'
-        ]
-        if word in special_tokens:
+        if word in SPECIAL_TOKENS:
             continue
             
         # Remove username patterns (@ mentions and parentheses)
@@ -68,171 +145,146 @@ def advanced_word_filter(text, stop_words):
     
     return filtered_words
 
+class TokenStats:
+    """
+    One tokenization pass over a chat. Holds raw word totals per user (for
+    fetch_stats) and advanced_word_filter token counts per user (for the word
+    cloud and top-words table). Each distinct message text is filtered once.
+    """
+
+    def __init__(self, df):
+        messages = df['message'].astype(str)
+        text_rows = ~messages.str.startswith('<') & (messages.str.strip() != '')
+        n_words = messages.str.split().str.len().where(text_rows, 0)
+        self.word_totals = n_words.groupby(df['user'], observed=True).sum()
+        
+        temp = df.loc[text_rows & (df['user'] != 'group_notification'), ['user', 'message']]
+        self.message_counts = temp.groupby('user', observed=True).size()
+        
+        stop_words = load_stop_words()
+        filtered = {}
+        def count(pairs):
+            counter = Counter()
+            for message, n in pairs:
+                words = filtered.get(message)
+                if words is None:
+                    words = filtered[message] = Counter(advanced_word_filter(message, stop_words))
+                for word, k in words.items():
+                    counter[word] += k * n
+            return counter
+        
+        self.overall = count(temp['message'].value_counts(sort=False).items())
+        self.by_user = {}
+        for (user, message), n in temp.groupby(['user', 'message'], observed=True, sort=False).size().items():
+            self.by_user.setdefault(user, []).append((message, n))
+        self.by_user = {user: count(pairs) for user, pairs in self.by_user.items()}
+
+    def words(self, selected_user):
+        if selected_user == 'Overall':
+            return int(self.word_totals.sum())
+        return int(self.word_totals.get(selected_user, 0))
+
+    def messages(self, selected_user):
+        if selected_user == 'Overall':
+            return int(self.message_counts.sum())
+        return int(self.message_counts.get(selected_user, 0))
+
+    def counts(self, selected_user):
+        if selected_user == 'Overall':
+            return self.overall
+        return self.by_user.get(selected_user, Counter())
+
+    def merge(self, other):
+        """Token counts of this chat followed by ``other``'s newer messages."""
+        merged = TokenStats.__new__(TokenStats)
+        merged.word_totals = _add_counts(self.word_totals, other.word_totals)
+        merged.message_counts = _add_counts(self.message_counts, other.message_counts)
+        merged.overall = self.overall + other.overall
+        merged.by_user = {user: self.by_user.get(user, Counter()) + other.by_user.get(user, Counter())
+                          for user in self.by_user.keys() | other.by_user.keys()}
+        return merged
+
+@profiled()
+def token_stats(df):
+    """The TokenStats of a parsed chat, built once per frame."""
+    return frame_cache.derived(df, 'token_stats', TokenStats)
+
+@profiled()
 def fetch_stats(selected_user, df):
-    if selected_user != 'Overall':
-        df = df[df['user'] == selected_user]
+    full_df, df = df, frame_cache.user_frame(df, selected_user)
     
     # fetch the number of messages
     num_messages = df.shape[0]
     
     # fetch the total number of words (excluding media and deleted messages)
-    words = []
-    for message in df['message']:
-        if not str(message).startswith('<') and str(message).strip():
-            words.extend(str(message).split())
+    words = token_stats(full_df).words(selected_user)
     
     # fetch number of media messages
-    num_media_messages = df[df['message'].str.contains('<Media omitted>|media omitted|<media|omitted>', case=False, na=False)].shape[0]
+    num_media_messages = int(df['is_media'].sum())
     
     # fetch number of links shared
-    links = []
-    for message in df['message']:
-        if not str(message).startswith('<'):
-            links.extend(extract.find_urls(str(message)))
+    num_links = int(df['n_links'].sum())
     
-    return num_messages, len(words), num_media_messages, len(links)
+    return num_messages, words, num_media_messages, num_links
 
+@profiled()
 def most_busy_users(df):
-    df_filtered = df[df['user'] != 'group_notification']
-    x = df_filtered['user'].value_counts().head()
-    df_percent = round((df_filtered['user'].value_counts() / df_filtered.shape[0]) * 100, 2).reset_index()
+    totals = activity_cube(df).user_totals
+    counts = totals.drop('group_notification', errors='ignore').sort_values(ascending=False, kind='stable')
+    x = counts.head()
+    df_percent = round((counts / counts.sum()) * 100, 2).reset_index()
     df_percent.columns = ['name', 'percent']
     return x, df_percent
 
+@profiled()
 def create_wordcloud(selected_user, df):
-    try:
-        with open('stop_hinglish.txt', 'r', encoding='utf-8') as f:
-            stop_words = set(f.read().lower().split())
-    except FileNotFoundError:
-        stop_words = set(['the', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by'])
+    stats = token_stats(df)
     
-    if selected_user != 'Overall':
-        df = df[df['user'] == selected_user]
-    
-    # Filter out system messages and media
-    temp = df[df['user'] != 'group_notification']
-    temp = temp[~temp['message'].str.startswith('<', na=False)]
-    temp = temp[temp['message'].str.strip() != '']
-    
-    if temp.empty:
+    if not stats.messages(selected_user):
         wc = WordCloud(width=500, height=500, min_font_size=10, background_color='white')
         return wc.generate("No messages available")
     
-    # Advanced filtering for wordcloud
-    all_words = []
-    for message in temp['message']:
-        filtered_words = advanced_word_filter(str(message), stop_words)
-        all_words.extend(filtered_words)
-    
-    if not all_words:
+    frequencies = stats.counts(selected_user)
+    if not frequencies:
         wc = WordCloud(width=500, height=500, min_font_size=10, background_color='white')
         return wc.generate("No meaningful words found")
     
     wc = WordCloud(width=500, height=500, min_font_size=10, background_color='white', 
                    max_words=100, relative_scaling=0.5, colormap='viridis')
-    df_wc = wc.generate(' '.join(all_words))
+    df_wc = wc.generate_from_frequencies(frequencies)
     return df_wc
 
+@profiled()
 def most_common_words(selected_user, df):
-    try:
-        with open('stop_hinglish.txt', 'r', encoding='utf-8') as f:
-            stop_words = set(f.read().lower().split())
-    except FileNotFoundError:
-        stop_words = set(['the', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by'])
-    
-    if selected_user != 'Overall':
-        df = df[df['user'] == selected_user]
+    word_counts = token_stats(df).counts(selected_user)
     
-    temp = df[df['user'] != 'group_notification']
-    temp = temp[~temp['message'].str.startswith('<', na=False)]
-    temp = temp[temp['message'].str.strip() != '']
-    
-    # Enhanced word filtering
-    all_words = []
-    for message in temp['message']:
-        filtered_words = advanced_word_filter(str(message), stop_words)
-        all_words.extend(filtered_words)
-    
-    if not all_words:
+    if not word_counts:
         return pd.DataFrame({0: ['No meaningful words'], 1: [0]})
     
     # Get most common words
-    word_counts = Counter(all_words)
     most_common_df = pd.DataFrame(word_counts.most_common(20))
     
     return most_common_df
 
+@profiled()
 def emoji_helper(selected_user, df):
-    if selected_user != 'Overall':
-        df = df[df['user'] == selected_user]
-    
-    emojis = []
-    
-    # Known good emojis (you can expand this list)
-    common_emojis = {
-        '😀', '😁', '😂', '🤣', '😃', '😄', '😅', '😆', '😉', '😊', '😋', '😎', '😍', '😘',
-        '🥰', '😗', '😙', '😚', '☺️', '🙂', '🤗', '🤩', '🤔', '🤨', '😐', '😑', '😶', '🙄',
-        '😏', '😣', '😥', '😮', '🤐', '😯', '😪', '😫', '😴', '😌', '😛', '😜', '😝', '🤤',
-        '😒', '😓', '😔', '😕', '🙃', '🤑', '😲', '☹️', '🙁', '😖', '😞', '😟', '😤', '😢',
-        '😭', '😦', '😧', '😨', '😩', '🤯', '😬', '😰', '😱', '🥵', '🥶', '😳', '🤪', '😵',
-        '🥴', '😠', '😡', '🤬', '😷', '🤒', '🤕', '🤢', '🤮', '🤧', '😇', '🥳', '🥺', '🤠',
-        '🤡', '🤥', '🤫', '🤭', '🧐', '🤓', '😈', '👿', '👹', '👺', '💀', '☠️', '👻', '👽',
-        '👾', '🤖', '🎃', '😺', '😸', '😹', '😻', '😼', '😽', '🙀', '😿', '😾', '❤️', '🧡',
-        '💛', '💚', '💙', '💜', '🤎', '🖤', '🤍', '💔', '❣️', '💕', '💞', '💓', '💗', '💖',
-        '💘', '💝', '💟', '♥️', '💯', '💢', '💥', '💫', '💦', '💨', '🕳️', '💬', '👁️‍🗨️',
-        '🗨️', '🗯️', '💭', '💤', '👋', '🤚', '🖐️', '✋', '🖖', '👌', '🤌', '🤏', '✌️',
-        '🤞', '🤟', '🤘', '🤙', '👈', '👉', '👆', '🖕', '👇', '☝️', '👍', '👎', '👊',
-        '✊', '🤛', '🤜', '👏', '🙌', '👐', '🤲', '🤝', '🙏', '✍️', '💅', '🤳', '💪',
-        '🦾', '🦵', '🦿', '🦶', '👂', '🦻', '👃', '🧠', '🫀', '🫁', '🦷', '🦴', '👀',
-        '👁️', '👅', '👄', '💋', '🩸'
-    }
-    
-    for message in df['message']:
-        if not str(message).startswith('<'):
-            message_text = str(message)
-            
-            # Method 1: Use regex to find emoji patterns
-            emoji_pattern = re.compile(
-                "["
-                "\U0001F600-\U0001F64F"  # emoticons
-                "\U0001F300-\U0001F5FF"  # symbols & pictographs
-                "\U0001F680-\U0001F6FF"  # transport & map
-                "\U0001F1E0-\U0001F1FF"  # flags (iOS)
-                "\U00002702-\U000027B0"  # dingbats
-                "\U000024C2-\U0001F251"
-                "]+", 
-                flags=re.UNICODE
-            )
-            
-            found_emojis = emoji_pattern.findall(message_text)
-            
-            # Method 2: Use emoji library as backup
-            try:
-                emoji_list = emoji.distinct_emoji_list(message_text)
-                found_emojis.extend(emoji_list)
-            except:
-                pass
-            
-            # Filter and add valid emojis
-            for e in found_emojis:
-                if e in common_emojis or (len(e) == 1 and ord(e) > 1000):
-                    emojis.append(e)
+    emoji_counts = frame_cache.derived(df, 'emoji_counts', EmojiCounts).counts(selected_user)
     
-    if not emojis:
+    if not emoji_counts:
         return pd.DataFrame({0: ['No emojis found'], 1: [0]})
     
     # Count and return top emojis
-    emoji_counts = Counter(emojis)
     top_emojis = emoji_counts.most_common(20)  # Limit to top 20
     
     emoji_df = pd.DataFrame(top_emojis)
     return emoji_df
 
+@profiled()
 def monthly_timeline(selected_user, df):
-    if selected_user != 'Overall':
-        df = df[df['user'] == selected_user]
+    cube = activity_cube(df).slice(selected_user)
     
-    timeline = df.groupby(['year', 'month_num', 'month']).count()['message'].reset_index()
+    timeline = cube.groupby(['year', 'month_num', 'month'], observed=True)['count'].sum().reset_index()
+    timeline = timeline.rename(columns={'count': 'message'})
     
     time = []
     for i in range(timeline.shape[0]):
@@ -241,28 +293,29 @@ def monthly_timeline(selected_user, df):
     timeline['time'] = time
     return timeline
 
+@profiled()
 def daily_timeline(selected_user, df):
-    if selected_user != 'Overall':
-        df = df[df['user'] == selected_user]
+    cube = activity_cube(df).slice(selected_user)
     
-    daily_timeline = df.groupby('only_date').count()['message'].reset_index()
-    return daily_timeline
+    daily_timeline = cube.groupby('only_date')['count'].sum().reset_index()
+    return daily_timeline.rename(columns={'count': 'message'})
 
+@profiled()
 def week_activity_map(selected_user, df):
-    if selected_user != 'Overall':
-        df = df[df['user'] == selected_user]
+    cube = activity_cube(df).slice(selected_user)
     
-    return df['day_name'].value_counts()
+    return _present(cube.groupby('day_name', observed=True)['count'].sum().sort_values(ascending=False))
 
+@profiled()
 def month_activity_map(selected_user, df):
-    if selected_user != 'Overall':
-        df = df[df['user'] == selected_user]
+    cube = activity_cube(df).slice(selected_user)
     
-    return df['month'].value_counts()
+    return _present(cube.groupby('month', observed=True)['count'].sum().sort_values(ascending=False))
 
+@profiled()
 def activity_heatmap(selected_user, df):
-    if selected_user != 'Overall':
-        df = df[df['user'] == selected_user]
+    cube = activity_cube(df).slice(selected_user)
     
-    user_heatmap = df.pivot_table(index='day_name', columns='period', values='message', aggfunc='count').fillna(0)
+    user_heatmap = cube.pivot_table(index='day_name', columns='period', values='count', aggfunc='sum',
+                                    observed=True).fillna(0)
     return user_heatmap
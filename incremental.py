@@ -0,0 +1,162 @@
+"""
+Incremental re-analysis of a newer export of an already processed chat.
+
+A re-export of a WhatsApp chat starts with the bytes of the previous export.
+``PrefixIndex`` remembers processed exports by the hash of their first
+HEAD_BYTES bytes, so a new upload is matched to the longest earlier export
+it extends. Uploads are hashed from their file object, never copied: the
+head first, then the earlier export's length of it on a head match. Only
+the new tail is then read and parsed, and the aggregates already built for
+the earlier frame (count cube, token and emoji counts, sentiment scores,
+topic model) are merged with those of the tail instead of being rebuilt
+from the whole history.
+"""
+import copy
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+import chat_cache
+import frame_cache
+import helper
+import preprocessor
+from emoji_extractor import EmojiCounts
+from sentiment import score_messages
+from topics import TOPICS_KEY, chat_documents
+
+HEAD_BYTES = 4096   # exports shorter than this are cheap to parse in full
+
+# Mergeable aggregates kept in frame_cache, and how to build them for a tail
+MERGEABLE = {
+    'activity_cube': helper.ActivityCube,
+    'token_stats': helper.TokenStats,
+    'emoji_counts': EmojiCounts,
+}
+
+
+def _size(fileobj):
+    pos = fileobj.tell()
+    size = fileobj.seek(0, os.SEEK_END)
+    fileobj.seek(pos)
+    return size
+
+
+def _read(fileobj, start, size=-1):
+    pos = fileobj.tell()
+    fileobj.seek(start)
+    data = fileobj.read(size)
+    fileobj.seek(pos)
+    return data
+
+
+class PrefixIndex:
+    """
+    Processed exports as head hash -> {byte length: content hash}. Uploads
+    are binary file objects; their position is left unchanged.
+    """
+
+    def __init__(self, max_heads=256):
+        self.max_heads = max_heads
+        self._heads = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, fileobj, key):
+        size = _size(fileobj)
+        if size < HEAD_BYTES:
+            return
+        head = chat_cache.content_hash(_read(fileobj, 0, HEAD_BYTES))
+        with self._lock:
+            self._heads.setdefault(head, {})[size] = key
+            self._heads.move_to_end(head)
+            while len(self._heads) > self.max_heads:
+                self._heads.popitem(last=False)
+
+    def find(self, fileobj):
+        """(length, key) of the longest earlier export that ``fileobj`` extends, or None."""
+        size = _size(fileobj)
+        if size < HEAD_BYTES:
+            return None
+        head = chat_cache.content_hash(_read(fileobj, 0, HEAD_BYTES))
+        with self._lock:
+            known = dict(self._heads.get(head, {}))
+        for length in sorted(known, reverse=True):
+            if length < size and chat_cache.content_hash(fileobj, length) == known[length]:
+                return length, known[length]
+        return None
+
+
+def _concat(base, tail):
+    if isinstance(base['user'].dtype, pd.CategoricalDtype):
+        # Keep user categorical: new users are appended to the base categories
+        tail = preprocessor.compact_frame(tail)
+        new_users = pd.Index(tail['user'].cat.categories).difference(base['user'].cat.categories)
+        users = base['user'].cat.categories.append(new_users)
+        base = base.assign(user=base['user'].cat.set_categories(users))
+        tail = tail.assign(user=tail['user'].cat.set_categories(users))
+    return pd.concat([base, tail]), tail
+
+
+def extend(base, tail_text):
+    """
+    ``base`` followed by the messages in ``tail_text``, the text that follows
+    the export ``base`` was parsed from. Returns None when the tail cannot be
+    appended cleanly (unknown date format, or text continuing the last
+    message), in which case the whole export has to be parsed.
+    """
+    pattern_info = preprocessor.PATTERNS_BY_NAME.get(base.attrs.get('format'))
+    date_format = base.attrs.get('date_format')
+    if pattern_info is None or date_format is None:
+        return None
+    first = pattern_info['regex'].search(tail_text)
+    if first is None or tail_text[:first.start()].strip():
+        return None
+
+    dates, bodies = preprocessor.split_messages(tail_text, pattern_info)
+    start = int(base.index.max()) + 1 if len(base) else 0
+    tail = preprocessor.build_frame(dates, bodies, pattern_info['date_formats'], date_format, start)
+    df, tail = _concat(base, tail)
+    df.attrs.update(base.attrs)
+
+    derived = frame_cache.entries(base)
+    for name, build in MERGEABLE.items():
+        if name in derived:
+            frame_cache.seed(df, name, derived[name].merge(build(tail)))
+    if 'sentiment' in derived:
+        frame_cache.seed(df, 'sentiment', pd.concat([derived['sentiment'], score_messages(tail)]))
+    model = derived.get(TOPICS_KEY)
+    if model is not None and model.fitted:
+        # The base frame keeps its own model; the copy learns the new messages
+        model = copy.deepcopy(model)
+        texts, rows = chat_documents(tail, start=len(base))
+        frame_cache.seed(df, TOPICS_KEY, model.update(texts, rows))
+    return df
+
+
+def get_or_parse(cache, index, fileobj, key, parse):
+    """
+    ChatCache.get_or_parse for an uploaded binary file: on a miss, an upload
+    that extends an earlier export still in ``cache`` is served by parsing
+    only its new tail; anything else falls back to ``parse()``, which may
+    return None while the frame is not ready yet.
+    """
+    def build():
+        found = index.find(fileobj)
+        if found is not None:
+            length, base_key = found
+            base = cache.get(base_key)
+            if base is not None:
+                try:
+                    df = extend(base, _read(fileobj, length).decode('utf-8'))
+                except UnicodeDecodeError:
+                    df = None
+                if df is not None:
+                    print(f"♻️  Reused {len(base)} messages from an earlier export, parsed {len(df) - len(base)} new")
+                    return df
+        return parse()
+
+    df = cache.get_or_parse(key, build)
+    if df is not None:
+        index.add(fileobj, key)
+    return df
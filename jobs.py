@@ -0,0 +1,240 @@
+"""
+Background jobs for heavy analyses.
+
+Parsing uploads, sentiment scoring, topic fitting, the report KPIs with
+their AI summary and report rendering run in a pool of worker processes
+instead of the Streamlit script thread. Workers publish progress through a
+Manager dict that the UI polls, and results are kept per chat hash so every
+session looking at the same chat shares them.
+"""
+import itertools
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+SPOOL_DIR = os.path.join(tempfile.gettempdir(), "chat-analyzer-uploads")
+
+
+def spool_path(key):
+    return os.path.join(SPOOL_DIR, f"{key}.txt")
+
+
+def spool(fileobj, key):
+    """
+    Copy an upload to a file a worker can read, in chunks, and return its
+    path; an upload already spooled under ``key`` is not written again.
+    """
+    path = spool_path(key)
+    if not os.path.exists(path):
+        os.makedirs(SPOOL_DIR, exist_ok=True)
+        pos = fileobj.tell()
+        fileobj.seek(0)
+        with open(path + ".tmp", "wb") as f:
+            shutil.copyfileobj(fileobj, f)
+        fileobj.seek(pos)
+        os.replace(path + ".tmp", path)
+    return path
+
+
+def unspool(key):
+    try:
+        os.remove(spool_path(key))
+    except FileNotFoundError:
+        pass
+
+
+def run_preprocess(report, path):
+    import preprocessor
+    with open(path, "rb") as upload:
+        return preprocessor.preprocess_file(upload, compact=True, progress=lambda f: report(0.95 * f, "Parsing chat"))
+
+
+def run_sentiment(report, df):
+    from sentiment import score_messages
+    # Already inside a worker process, so no nested pool
+    return score_messages(df, workers=1, progress=lambda f: report(f, "Scoring sentiment"))
+
+
+def run_topics(report, df):
+    from topics import fit_chat_topics
+    return fit_chat_topics(df, progress=lambda f: report(f, "Fitting topics"))
+
+
+def run_analysis(report, df, selected_user, detected_format, derived=None):
+    """Report KPIs of one chat and user, AI summary included."""
+    import frame_cache
+    from analysis_bundle import AnalysisBundle
+    from sentiment import message_sentiment
+    # Sentiment and topics already computed by other jobs are not redone
+    for name, value in (derived or {}).items():
+        frame_cache.seed(df, name, value)
+    report(0.1, "Scoring sentiment")
+    message_sentiment(df, workers=1)
+    report(0.4, "Writing AI summary")
+    return AnalysisBundle(df, selected_user, detected_format).analysis_data()
+
+
+def run_report(report, analysis_data, selected_user, detected_format, charts_data):
+    """PDF and DOCX of one report, rendered in the same worker so they share chart images."""
+    from report_generator import ReportGenerator
+    rep = ReportGenerator()
+    report(0.1, "Rendering PDF")
+    pdf = rep.generate_pdf_report(analysis_data, selected_user, detected_format, charts_data).getvalue()
+    report(0.6, "Rendering DOCX")
+    docx = rep.generate_docx_report(analysis_data, selected_user, detected_format, charts_data).getvalue()
+    return {"pdf": pdf, "docx": docx}
+
+
+TASKS = {
+    "preprocess": run_preprocess,
+    "sentiment": run_sentiment,
+    "topics": run_topics,
+    "analysis": run_analysis,
+    "report": run_report,
+}
+
+
+def _run(task, job_id, progress, args, kwargs):
+    def report(fraction, message=None):
+        progress[job_id] = (min(max(float(fraction), 0.0), 1.0), message)
+    report(0.0, "Started")
+    result = TASKS[task](report, *args, **kwargs)
+    report(1.0, "Done")
+    return result
+
+
+class Job:
+    def __init__(self, job_id, chat_hash, task, key, future):
+        self.id = job_id
+        self.chat_hash = chat_hash
+        self.task = task
+        self.key = key
+        self.future = future
+        self.submitted = time.time()
+
+
+class JobQueue:
+    """
+    Process pool running TASKS, one job per (chat hash, task, key).
+
+    ``submit`` returns the id of the existing job when the same work was
+    already requested (unless it failed), so polling reruns can call it
+    freely. Only the newest ``max_finished`` finished jobs are kept.
+    """
+
+    def __init__(self, workers=None, max_finished=64):
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.max_finished = max_finished
+        self._pool = None
+        self._manager = None
+        self._progress = None
+        self._jobs = {}
+        self._by_key = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """Build a queue from JOB_WORKERS / JOB_MAX_FINISHED environment variables."""
+        workers = int(os.getenv("JOB_WORKERS", "0")) or None
+        return cls(workers=workers, max_finished=int(os.getenv("JOB_MAX_FINISHED", "64")))
+
+    def _start(self):
+        # spawn: the app process is multi-threaded, fork is not safe there
+        ctx = multiprocessing.get_context("spawn")
+        if self._manager is None:
+            self._manager = ctx.Manager()
+            self._progress = self._manager.dict()
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx)
+
+    def _restart(self):
+        # A dead worker (e.g. killed for memory) breaks the whole executor;
+        # its jobs fail, and later ones go to a fresh pool
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = None
+        self._start()
+
+    def submit(self, chat_hash, task, *args, key=None, **kwargs):
+        if task not in TASKS:
+            raise ValueError(f"Unknown job task: {task}")
+        job_key = (chat_hash, task, key)
+        with self._lock:
+            job_id = self._by_key.get(job_key)
+            if job_id is not None and self._state(self._jobs[job_id]) != FAILED:
+                return job_id
+            self._start()
+            job_id = next(self._ids)
+            try:
+                future = self._pool.submit(_run, task, job_id, self._progress, args, kwargs)
+            except BrokenProcessPool:
+                self._restart()
+                future = self._pool.submit(_run, task, job_id, self._progress, args, kwargs)
+            self._jobs[job_id] = Job(job_id, chat_hash, task, key, future)
+            self._by_key[job_key] = job_id
+            self._evict()
+            return job_id
+
+    def find(self, chat_hash, task, key=None):
+        return self._by_key.get((chat_hash, task, key))
+
+    def _state(self, job):
+        f = job.future
+        if not f.done():
+            return RUNNING if f.running() else PENDING
+        return FAILED if f.exception() is not None else DONE
+
+    def status(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        state = self._state(job)
+        fraction, message = self._progress.get(job_id, (0.0, None))
+        if state == DONE:
+            fraction = 1.0
+        return {
+            "id": job_id,
+            "task": job.task,
+            "state": state,
+            "progress": fraction,
+            "message": message,
+            "error": str(job.future.exception()) if state == FAILED else None,
+            "seconds": round(time.time() - job.submitted, 1),
+        }
+
+    def result(self, job_id):
+        """The job's result once it finished, otherwise None."""
+        job = self._jobs.get(job_id)
+        if job is None or self._state(job) != DONE:
+            return None
+        return job.future.result()
+
+    def forget(self, job_id):
+        """Drop a finished job, so a large result is not kept twice."""
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+            if job is None:
+                return
+            if self._by_key.get((job.chat_hash, job.task, job.key)) == job_id:
+                del self._by_key[(job.chat_hash, job.task, job.key)]
+            self._progress.pop(job_id, None)
+
+    def _evict(self):
+        finished = [j for j in self._jobs.values() if j.future.done()]
+        for job in sorted(finished, key=lambda j: j.submitted)[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job.id]
+            if self._by_key.get((job.chat_hash, job.task, job.key)) == job.id:
+                del self._by_key[(job.chat_hash, job.task, job.key)]
+            self._progress.pop(job.id, None)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._manager.shutdown()
+            self._pool = self._manager = self._progress = None
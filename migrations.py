@@ -0,0 +1,87 @@
+"""
+Versioned database schema.
+
+Each migration runs once per database and is recorded in ``schema_version``.
+``migrate()`` applies whatever is missing under a Postgres advisory lock, so
+several app processes starting together do not race; the app calls it once
+per process at startup instead of issuing DDL on every rerun.
+"""
+import threading
+
+import db_pool
+from profiling import profiled
+
+# (version, description, statements); append new versions, never edit old ones
+MIGRATIONS = [
+    (1, "users and reports tables", [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id SERIAL PRIMARY KEY,
+            email VARCHAR(255) UNIQUE NOT NULL,
+            hashed_password BYTEA,
+            name VARCHAR(255) NOT NULL,
+            google_id VARCHAR(255),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS reports (
+            id SERIAL PRIMARY KEY,
+            user_email VARCHAR(255) NOT NULL REFERENCES users(email) ON DELETE CASCADE,
+            title VARCHAR(255) NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            kpi_json JSONB NOT NULL,
+            summary_text TEXT,
+            pdf_path TEXT,
+            docx_path TEXT
+        );
+        """,
+    ]),
+    (2, "index reports by owner, newest first", [
+        "CREATE INDEX IF NOT EXISTS idx_reports_user_created ON reports (user_email, created_at DESC, id DESC);",
+    ]),
+    (3, "link reports to the stored chat dataset", [
+        "ALTER TABLE reports ADD COLUMN IF NOT EXISTS dataset_path TEXT;",
+        "ALTER TABLE reports ADD COLUMN IF NOT EXISTS dataset_hash VARCHAR(64);",
+    ]),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+LOCK_ID = 746120   # pg_advisory_xact_lock key for schema changes
+
+_applied = None
+_lock = threading.Lock()
+
+
+@profiled()
+def migrate():
+    """Apply pending migrations; returns the schema version now in place."""
+    with db_pool.connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_xact_lock(%s)", (LOCK_ID,))
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """)
+        cur.execute("SELECT COALESCE(MAX(version), 0) AS version FROM schema_version")
+        current = cur.fetchone()["version"]
+        for version, description, statements in MIGRATIONS:
+            if version <= current:
+                continue
+            for sql in statements:
+                cur.execute(sql)
+            cur.execute("INSERT INTO schema_version (version, description) VALUES (%s, %s)", (version, description))
+            print(f"🗄️  Applied schema migration {version}: {description}")
+            current = version
+        return current
+
+
+def ensure_schema():
+    """Run ``migrate()`` at most once per process."""
+    global _applied
+    with _lock:
+        if _applied is None:
+            _applied = migrate()
+        return _applied
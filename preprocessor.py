@@ -1,208 +1,355 @@
+import codecs
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
 from datetime import datetime
 
-def preprocess(data):
+from profiling import profiled
+
+# All known WhatsApp export header patterns, in priority order
+PATTERNS = [
+    # iOS Patterns (check first as they're more specific)
+    {
+        'name': 'iOS_12h_seconds',
+        'pattern': r'\[(\d{1,2}/\d{1,2}/\d{2,4},\s\d{1,2}:\d{2}:\d{2}\s(?:AM|PM))\]',
+        'date_formats': [
+            '%d/%m/%y, %I:%M:%S %p',    # [08/07/24, 11:44:33 AM]
+            '%d/%m/%Y, %I:%M:%S %p',    # [08/07/2024, 11:44:33 AM]
+            '%m/%d/%y, %I:%M:%S %p',    # US format [07/08/24, 11:44:33 AM]
+            '%m/%d/%Y, %I:%M:%S %p',    # US format [07/08/2024, 11:44:33 AM]
+        ]
+    },
+    {
+        'name': 'iOS_24h_seconds',
+        'pattern': r'\[(\d{1,2}/\d{1,2}/\d{2,4},\s\d{1,2}:\d{2}:\d{2})\]',
+        'date_formats': [
+            '%d/%m/%y, %H:%M:%S',       # [08/07/24, 23:44:33]
+            '%d/%m/%Y, %H:%M:%S',       # [08/07/2024, 23:44:33]
+            '%m/%d/%y, %H:%M:%S',       # US format
+            '%m/%d/%Y, %H:%M:%S',       # US format
+        ]
+    },
+    {
+        'name': 'iOS_12h_no_seconds',
+        'pattern': r'\[(\d{1,2}/\d{1,2}/\d{2,4},\s\d{1,2}:\d{2}\s(?:AM|PM))\]',
+        'date_formats': [
+            '%d/%m/%y, %I:%M %p',       # [08/07/24, 11:44 AM]
+            '%d/%m/%Y, %I:%M %p',       # [08/07/2024, 11:44 AM]
+            '%m/%d/%y, %I:%M %p',       # US format
+            '%m/%d/%Y, %I:%M %p',       # US format
+        ]
+    },
+    # Android Patterns (check after iOS)
+    {
+        'name': 'Android_standard',
+        'pattern': r'(\d{1,2}/\d{1,2}/\d{2,4},\s\d{1,2}:\d{2})\s-\s',
+        'date_formats': [
+            '%d/%m/%y, %H:%M',          # 13/01/24, 12:01 - 
+            '%d/%m/%Y, %H:%M',          # 13/01/2024, 12:01 -
+            '%m/%d/%y, %H:%M',          # US format
+            '%m/%d/%Y, %H:%M',          # US format
+        ]
+    },
+    {
+        'name': 'Android_with_seconds',
+        'pattern': r'(\d{1,2}/\d{1,2}/\d{2,4},\s\d{1,2}:\d{2}:\d{2})\s-\s',
+        'date_formats': [
+            '%d/%m/%y, %H:%M:%S',       # 13/01/24, 12:01:30 -
+            '%d/%m/%Y, %H:%M:%S',       # 13/01/2024, 12:01:30 -
+        ]
+    }
+]
+
+# Headers only count at the start of a line; iOS prefixes system lines with
+# a left-to-right mark and some exports start with a BOM.
+_LINE_START = r'^[\ufeff\u200e\u200f]?'
+
+for _p in PATTERNS:
+    _p['regex'] = re.compile(_LINE_START + _p['pattern'], re.MULTILINE)
+
+PATTERNS_BY_NAME = {p['name']: p for p in PATTERNS}
+
+MONTH_NAMES = ['January', 'February', 'March', 'April', 'May', 'June', 'July',
+               'August', 'September', 'October', 'November', 'December']
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+PERIODS = [f"{hour:02d}-{(hour + 1) % 24:02d}" for hour in range(24)]
+
+_PERIOD_LOOKUP = np.array(PERIODS, dtype=object)
+
+SYSTEM_KEYWORDS = [
+    'Messages and calls are end-to-end encrypted',
+    'created group',
+    'added you',
+    'left',
+    'joined using',
+    'changed the group',
+    'security code changed',
+    'deleted this message',
+    'message was deleted',
+    'media omitted',
+    'sticker omitted',
+    'image omitted',
+    'video omitted',
+    'audio omitted',
+    'document omitted',
+    'gif omitted'
+]
+
+# Dashes and every character str.isspace() accepts, trimmed around usernames
+_USERNAME_STRIP = '-' + ''.join(chr(c) for c in range(0x3001) if chr(c).isspace())
+
+# Any system keyword, case-insensitive, in one compiled alternation
+SYSTEM_RE = re.compile('|'.join(re.escape(k) for k in SYSTEM_KEYWORDS), re.IGNORECASE)
+
+# Dtypes used by compact_frame(); low-cardinality text becomes categorical
+COMPACT_DTYPES = {
+    'month': pd.CategoricalDtype(MONTH_NAMES),
+    'day_name': pd.CategoricalDtype(DAY_NAMES),
+    'period': pd.CategoricalDtype(PERIODS),
+    'year': 'int16',
+    'month_num': 'int8',
+    'day': 'int8',
+    'hour': 'int8',
+    'minute': 'int8',
+    'n_links': 'int16',
+}
+
+SAMPLE_SIZE = 64 * 1024   # characters inspected at the start (and middle) of a file
+MIN_MATCHES = 4           # need a reasonable number of messages to trust a pattern
+
+FORMAT_ERROR = ("❌ Could not detect WhatsApp chat format. Supported formats:\n"
+                "- iOS: [DD/MM/YY, HH:MM:SS AM/PM] username: message\n"
+                "- Android: DD/MM/YY, HH:MM - username: message")
+
+
+def _sample(data, start, size=SAMPLE_SIZE):
+    """Return ``size`` characters of ``data`` from the first line start at/after ``start``."""
+    if start > 0:
+        nl = data.find('\n', start)
+        if nl == -1:
+            return ''
+        start = nl + 1
+    return data[start:start + size]
+
+
+@profiled()
+def detect_format(data):
     """
-    Universal WhatsApp chat preprocessor that handles ALL export formats:
-    - iOS: [08/07/24, 11:44:33 AM] username: message
-    - Android: 13/01/24, 12:01 - username: message
-    - Various date formats and edge cases
+    Decide the export format from a sample at the start of the file, confirmed
+    by a second sample taken halfway through. Only falls back to scanning the
+    whole text when the samples are inconclusive. Returns a PATTERNS entry or None.
     """
-    
-    # Define all possible WhatsApp export patterns with priority order
-    patterns = [
-        # iOS Patterns (check first as they're more specific)
-        {
-            'name': 'iOS_12h_seconds',
-            'pattern': r'\[(\d{1,2}/\d{1,2}/\d{2,4},\s\d{1,2}:\d{2}:\d{2}\s(?:AM|PM))\]',
-            'date_formats': [
-                '%d/%m/%y, %I:%M:%S %p',    # [08/07/24, 11:44:33 AM]
-                '%d/%m/%Y, %I:%M:%S %p',    # [08/07/2024, 11:44:33 AM]
-                '%m/%d/%y, %I:%M:%S %p',    # US format [07/08/24, 11:44:33 AM]
-                '%m/%d/%Y, %I:%M:%S %p',    # US format [07/08/2024, 11:44:33 AM]
-            ]
-        },
-        {
-            'name': 'iOS_24h_seconds',
-            'pattern': r'\[(\d{1,2}/\d{1,2}/\d{2,4},\s\d{1,2}:\d{2}:\d{2})\]',
-            'date_formats': [
-                '%d/%m/%y, %H:%M:%S',       # [08/07/24, 23:44:33]
-                '%d/%m/%Y, %H:%M:%S',       # [08/07/2024, 23:44:33]
-                '%m/%d/%y, %H:%M:%S',       # US format
-                '%m/%d/%Y, %H:%M:%S',       # US format
-            ]
-        },
-        {
-            'name': 'iOS_12h_no_seconds',
-            'pattern': r'\[(\d{1,2}/\d{1,2}/\d{2,4},\s\d{1,2}:\d{2}\s(?:AM|PM))\]',
-            'date_formats': [
-                '%d/%m/%y, %I:%M %p',       # [08/07/24, 11:44 AM]
-                '%d/%m/%Y, %I:%M %p',       # [08/07/2024, 11:44 AM]
-                '%m/%d/%y, %I:%M %p',       # US format
-                '%m/%d/%Y, %I:%M %p',       # US format
-            ]
-        },
-        # Android Patterns (check after iOS)
-        {
-            'name': 'Android_standard',
-            'pattern': r'(\d{1,2}/\d{1,2}/\d{2,4},\s\d{1,2}:\d{2})\s-\s',
-            'date_formats': [
-                '%d/%m/%y, %H:%M',          # 13/01/24, 12:01 - 
-                '%d/%m/%Y, %H:%M',          # 13/01/2024, 12:01 -
-                '%m/%d/%y, %H:%M',          # US format
-                '%m/%d/%Y, %H:%M',          # US format
-            ]
-        },
-        {
-            'name': 'Android_with_seconds',
-            'pattern': r'(\d{1,2}/\d{1,2}/\d{2,4},\s\d{1,2}:\d{2}:\d{2})\s-\s',
-            'date_formats': [
-                '%d/%m/%y, %H:%M:%S',       # 13/01/24, 12:01:30 -
-                '%d/%m/%Y, %H:%M:%S',       # 13/01/2024, 12:01:30 -
-            ]
-        }
-    ]
-    
-    messages = []
-    dates = []
-    used_pattern = None
-    used_formats = []
-    
-    # Try each pattern until we find a working one
-    for pattern_info in patterns:
-        pattern = pattern_info['pattern']
-        test_dates = re.findall(pattern, data)
-        
-        if test_dates and len(test_dates) > 3:  # Need reasonable number of messages
-            print(f"✅ Detected format: {pattern_info['name']}")
-            
-            # Split messages using the same pattern
-            split_data = re.split(pattern, data)
-            
-            # Extract messages (skip first empty element)
-            raw_messages = []
-            for i in range(2, len(split_data), 2):  # Every other element starting from index 2
-                if i < len(split_data):
-                    raw_messages.append(split_data[i])
-            
-            # Ensure we have matching dates and messages
-            min_length = min(len(test_dates), len(raw_messages))
-            dates = test_dates[:min_length]
-            messages = raw_messages[:min_length]
-            used_pattern = pattern_info['name']
-            used_formats = pattern_info['date_formats']
+    head = _sample(data, 0)
+    middle = _sample(data, len(data) // 2) if len(data) > 2 * SAMPLE_SIZE else ''
+
+    for pattern_info in PATTERNS:
+        if len(pattern_info['regex'].findall(head)) >= MIN_MATCHES:
+            if not middle or pattern_info['regex'].search(middle):
+                return pattern_info
             break
+
+    # Samples disagree or are too sparse (e.g. very long messages) - scan everything
+    if len(head) < len(data):
+        for pattern_info in PATTERNS:
+            if len(pattern_info['regex'].findall(data)) >= MIN_MATCHES:
+                return pattern_info
+    return None
+
+
+def _scan(data, regex):
+    dates, bodies = [], []
+    prev_end = last_start = None
+    for m in regex.finditer(data):
+        if prev_end is not None:
+            bodies.append(data[prev_end:m.start()])
+        dates.append(m.group(1))
+        prev_end, last_start = m.end(), m.start()
+    return dates, bodies, last_start, prev_end
+
+
+@profiled(rows=lambda r: len(r[0]))
+def split_messages(data, pattern_info):
+    """
+    Single anchored pass over the text: every header match yields its date
+    string, and the message body is the text up to the next header.
+    """
+    dates, bodies, _, last_end = _scan(data, pattern_info['regex'])
+    if last_end is not None:
+        bodies.append(data[last_end:])
+    return dates, bodies
+
+
+_ODD_SPACE = re.compile(r'[^\S ]')
+
+
+def _format_order(fmt):
+    return 'dmy' if fmt.startswith('%d') else 'mdy'
+
+
+def _day_strings(date_strings):
+    return {str(d).split(',', 1)[0] for d in date_strings}
+
+
+@profiled()
+def infer_date_format(date_strings, date_formats):
+    """
+    Work out the dominant date format for a whole file at once: day-first vs
+    month-first from whichever leading field ever exceeds 12, and 2- vs 4-digit
+    year from the majority. Returns ``(format, decided)`` where ``decided`` is
+    False when no row disambiguated day/month order.
+    """
+    # Only the day part matters, and a chat has far fewer days than messages
+    days = _day_strings(date_strings)
+    parts = pd.Series(sorted(days), dtype=object).str.extract(r'(\d{1,2})/(\d{1,2})/(\d{2,4})')
+    first = pd.to_numeric(parts[0], errors='coerce')
+    second = pd.to_numeric(parts[1], errors='coerce')
+    day_first_votes = int((first > 12).sum())
+    month_first_votes = int((second > 12).sum())
+    decided = bool(day_first_votes or month_first_votes)
+    order = 'mdy' if month_first_votes > day_first_votes else 'dmy'
+    year4 = bool((parts[2].str.len() == 4).sum() > (parts[2].str.len() == 2).sum())
+
+    for fmt in date_formats:
+        if _format_order(fmt) == order and ('%Y' in fmt) == year4:
+            return fmt, decided
+    for fmt in date_formats:
+        if ('%Y' in fmt) == year4:
+            return fmt, decided
+    return date_formats[0], decided
+
+
+def parse_date_flexible(date_str, date_formats):
+    """Parse one date string, trying every known format before dateutil inference."""
+    date_str = date_str.strip('[]').strip()
     
-    if not dates:
-        raise ValueError("❌ Could not detect WhatsApp chat format. Supported formats:\n"
-                        "- iOS: [DD/MM/YY, HH:MM:SS AM/PM] username: message\n"
-                        "- Android: DD/MM/YY, HH:MM - username: message")
-    
-    print(f"📱 Processing {len(dates)} messages using {used_pattern} format")
-    
-    # Parse dates with multiple format attempts
-    def parse_date_flexible(date_str):
-        date_str = date_str.strip('[]').strip()
-        
-        for fmt in used_formats:
-            try:
-                return pd.to_datetime(date_str, format=fmt)
-            except:
-                continue
-        
-        # Fallback to pandas automatic parsing
+    for fmt in date_formats:
         try:
-            return pd.to_datetime(date_str, dayfirst=True)
+            return pd.to_datetime(date_str, format=fmt)
         except:
-            print(f"⚠️  Failed to parse date: {date_str}")
-            return pd.NaT
+            continue
     
-    parsed_dates = [parse_date_flexible(d) for d in dates]
+    # Fallback to pandas automatic parsing
+    try:
+        return pd.to_datetime(date_str, dayfirst=True)
+    except:
+        print(f"⚠️  Failed to parse date: {date_str}")
+        return pd.NaT
+
+
+@profiled()
+def parse_dates(date_strings, date_formats, date_format=None):
+    """
+    Convert a whole column of header date strings in one vectorized call using
+    the file's dominant format; only rows that fail are re-parsed one by one.
+    """
+    dates = pd.Series(date_strings, dtype=object)
+    # Newer iOS exports use a narrow no-break space before AM/PM
+    if _ODD_SPACE.search(''.join(dates.head(1000).astype(str))):
+        dates = dates.str.replace(r'\s+', ' ', regex=True)
+    if date_format is None:
+        date_format, _ = infer_date_format(dates, date_formats)
+
+    parsed = pd.to_datetime(dates, format=date_format, errors='coerce')
+    failed = parsed.isna() & dates.notna()
+    if failed.any():
+        parsed = parsed.astype(object)
+        parsed[failed] = [parse_date_flexible(d, date_formats) for d in dates[failed]]
+        parsed = pd.to_datetime(parsed)
+    return parsed
+
+
+@profiled()
+def extract_users(raw_messages):
+    """
+    Split raw message bodies into (user, message) columns with vectorized
+    string operations. System lines, and lines whose text before the first
+    colon is not a plausible username, are attributed to 'group_notification'
+    and keep their full text.
+    """
+    messages = pd.Series(raw_messages, dtype=object).map(str).str.strip()
+    is_system = messages.str.contains(SYSTEM_RE, na=False)
+    
+    parts = messages.str.partition(':')
+    head, colon, body = parts[0], parts[1], parts[2]
+    username = head.str.strip(_USERNAME_STRIP)
+    content = body.str.strip()
+    
+    valid = (
+        ~is_system
+        & (colon == ':')
+        & username.str.len().between(1, 49)
+        & ~username.str.startswith('http')
+        & ~username.str.isdigit()
+        & ~username.str.match(r'\d+/\d+/\d+')
+    )
+    users = username.where(valid, 'group_notification')
+    clean = content.mask(content == '', '<Empty message>').where(valid, messages)
+    return users.values, clean.values
+
+
+MEDIA_RE = re.compile(r'<Media omitted>|media omitted|<media|omitted>', re.IGNORECASE)
+# Media, omitted and deleted lines have no text for sentiment or topic models
+TEXT_SKIP_RE = re.compile(r'<|omitted|deleted', re.IGNORECASE)
+# urlextract only reports hosts ending in a TLD or IPv4 addresses, so a link
+# needs a dot followed by a letter, or a dotted quad
+_LINK_HINT = re.compile(r'\.[^\W\d_]|\d\.\d{1,3}\.\d{1,3}\.\d')
+_url_extractor = None
+
+
+def _find_urls(text):
+    global _url_extractor
+    if _url_extractor is None:
+        from urlextract import URLExtract
+        _url_extractor = URLExtract()
+    return _url_extractor.find_urls(text)
+
+
+@profiled()
+def classify_content(messages):
+    """
+    Per-message ``(n_links, is_media)`` columns. Only messages that pass a cheap
+    vectorized pre-filter are handed to urlextract, each distinct text once.
+    """
+    messages = pd.Series(messages, dtype=object).map(str)
+    is_media = messages.str.contains(MEDIA_RE, na=False)
+    
+    candidates = ~messages.str.startswith('<') & messages.str.contains(_LINK_HINT, na=False)
+    n_links = np.zeros(len(messages), dtype='int64')
+    if candidates.any():
+        found = {text: len(_find_urls(text)) for text in pd.unique(messages[candidates])}
+        n_links[candidates.to_numpy()] = messages[candidates].map(found).to_numpy()
+    return n_links, is_media.to_numpy()
+
+
+@profiled()
+def build_frame(dates, messages, date_formats, date_format=None, start=0):
+    """
+    Turn split header dates and message bodies into the analysis DataFrame.
+    Rows are numbered from ``start`` so batches can be concatenated in order;
+    rows whose date cannot be parsed are dropped.
+    """
+    parsed_dates = parse_dates(dates, date_formats, date_format)
     
     # Create DataFrame
     df = pd.DataFrame({
         'user_message': messages,
-        'message_date': parsed_dates
-    })
+        'message_date': parsed_dates.values
+    }, index=pd.RangeIndex(start, start + len(dates)))
     
     # Remove rows with failed date parsing
-    original_count = len(df)
     df = df.dropna(subset=['message_date'])
-    if len(df) < original_count:
-        print(f"⚠️  Removed {original_count - len(df)} messages with invalid dates")
     
     df.rename(columns={'message_date': 'date'}, inplace=True)
     
     # Extract users and messages with enhanced parsing
-    users = []
-    clean_messages = []
-    
-    system_keywords = [
-        'Messages and calls are end-to-end encrypted',
-        'created group',
-        'added you',
-        'left',
-        'joined using',
-        'changed the group',
-        'security code changed',
-        'deleted this message',
-        'message was deleted',
-        'media omitted',
-        'sticker omitted',
-        'image omitted',
-        'video omitted',
-        'audio omitted',
-        'document omitted',
-        'gif omitted'
-    ]
-    
-    for message in df['user_message']:
-        message = str(message).strip()
-        
-        # Check for system messages
-        is_system = any(keyword.lower() in message.lower() for keyword in system_keywords)
-        
-        if is_system:
-            users.append('group_notification')
-            clean_messages.append(message)
-            continue
-        
-        # Extract username and message content
-        if ':' in message:
-            parts = message.split(':', 1)
-            if len(parts) == 2:
-                username = parts[0].strip()
-                msg_content = parts[1].strip()
-                
-                # Clean username
-                username = re.sub(r'[\-\s]*$', '', username)
-                username = re.sub(r'^[\-\s]*', '', username)
-                
-                # Validate username
-                if (username and 
-                    len(username) < 50 and 
-                    not username.startswith('http') and
-                    not username.isdigit() and
-                    not re.match(r'^\d+/\d+/\d+', username)):
-                    
-                    users.append(username)
-                    clean_messages.append(msg_content if msg_content else '<Empty message>')
-                else:
-                    users.append('group_notification')
-                    clean_messages.append(message)
-            else:
-                users.append('group_notification')
-                clean_messages.append(message)
-        else:
-            users.append('group_notification')
-            clean_messages.append(message)
-    
-    # Update DataFrame
-    df['user'] = users
-    df['message'] = clean_messages
+    df['user'], df['message'] = extract_users(df['user_message'])
     df.drop(columns=['user_message'], inplace=True)
     
+    # Links and media, counted once here so stats are column sums per user
+    df['n_links'], df['is_media'] = classify_content(df['message'])
+    
     # Add time-based features
     df['only_date'] = df['date'].dt.date
     df['year'] = df['date'].dt.year
@@ -214,22 +361,249 @@ def preprocess(data):
     df['minute'] = df['date'].dt.minute
     
     # Create time periods for activity heatmap
-    period = []
-    for hour in df['hour']:
-        if hour == 23:
-            period.append("23-00")
-        elif hour == 0:
-            period.append("00-01")
-        else:
-            period.append(f"{hour:02d}-{hour+1:02d}")
-    
-    df['period'] = period
-    
-    # Print summary
+    df['period'] = _PERIOD_LOOKUP[df['hour'].to_numpy()]
+    
+    return df
+
+
+@profiled()
+def compact_frame(df):
+    """
+    Return a memory-compact copy of a preprocessed chat: categorical user,
+    month, day_name and period columns, small integer date parts and a
+    datetime64 ``only_date`` (midnight of each day) instead of date objects.
+    """
+    df = df.copy()
+    df['user'] = df['user'].astype('category')
+    df['only_date'] = df['date'].dt.normalize()
+    for col, dtype in COMPACT_DTYPES.items():
+        df[col] = df[col].astype(dtype)
+    return df
+
+
+@profiled()
+def preprocess(data, compact=False):
+    """
+    Universal WhatsApp chat preprocessor that handles ALL export formats:
+    - iOS: [08/07/24, 11:44:33 AM] username: message
+    - Android: 13/01/24, 12:01 - username: message
+    - Various date formats and edge cases
+    
+    With ``compact=True`` the frame uses the compact_frame() schema.
+    """
+    
+    pattern_info = detect_format(data)
+    
+    if pattern_info is None:
+        raise ValueError(FORMAT_ERROR)
+    
+    used_pattern = pattern_info['name']
+    used_formats = pattern_info['date_formats']
+    print(f"✅ Detected format: {used_pattern}")
+    
+    dates, messages = split_messages(data, pattern_info)
+    
+    print(f"📱 Processing {len(dates)} messages using {used_pattern} format")
+    
+    date_format, _ = infer_date_format(dates, used_formats)
+    df = build_frame(dates, messages, used_formats, date_format)
+    
+    # Remove rows with failed date parsing
+    if len(df) < len(dates):
+        print(f"⚠️  Removed {len(dates) - len(df)} messages with invalid dates")
+    
+    if compact:
+        df = compact_frame(df)
+    df.attrs['format'] = used_pattern
+    df.attrs['date_format'] = date_format
+    
+    _print_summary(df)
+    return df
+
+
+def _print_summary(df):
     unique_users = [u for u in df['user'].unique() if u != 'group_notification']
     print(f"✅ Successfully processed {len(df)} messages")
     print(f"👥 Found {len(unique_users)} unique users: {', '.join(unique_users[:5])}")
     if len(unique_users) > 5:
         print(f"    ... and {len(unique_users) - 5} more")
-    
+
+
+CHUNK_SIZE = 1024 * 1024   # characters read from the upload per step
+BATCH_SIZE = 50_000        # messages per yielded DataFrame
+
+
+def _iter_text(fileobj, chunk_size):
+    """Read ``fileobj`` (binary or text) as decoded text chunks."""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            break
+        yield decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def preprocess_stream(fileobj, chunk_size=CHUNK_SIZE, batch_size=BATCH_SIZE):
+    """
+    Streaming variant of ``preprocess`` for exports too large to hold as one
+    string. Reads ``fileobj`` in chunks and yields DataFrame batches in order.
+    The last message of every chunk is carried over until the next header is
+    seen, so multi-line messages and headers cut by a chunk boundary are
+    parsed exactly as in the whole-text path.
+    """
+    chunks = _iter_text(fileobj, chunk_size)
+    buf = ''
+    for chunk in chunks:
+        buf += chunk
+        if len(buf) >= SAMPLE_SIZE:
+            break
+
+    pattern_info = detect_format(buf)
+    if pattern_info is None:
+        raise ValueError(FORMAT_ERROR)
+    regex = pattern_info['regex']
+    date_formats = pattern_info['date_formats']
+    print(f"✅ Detected format: {pattern_info['name']}")
+
+    # Day/month order is fixed by the first messages that disambiguate it;
+    # until then nothing is parsed, so no batch uses a guessed order
+    date_format = None
+    dates, bodies = [], []
+    start = 0
+
+    def decide(final=False):
+        nonlocal date_format
+        if date_format is None:
+            fmt, decided = infer_date_format(dates, date_formats)
+            if decided or final:
+                date_format = fmt
+        return date_format is not None
+
+    def flush():
+        nonlocal dates, bodies, start
+        df = build_frame(dates, bodies, date_formats, date_format, start)
+        df.attrs['format'] = pattern_info['name']
+        df.attrs['date_format'] = date_format
+        start += len(dates)
+        dates, bodies = [], []
+        return df
+
+    for chunk in chunks:
+        buf += chunk
+        chunk_dates, chunk_bodies, last_start, _ = _scan(buf, regex)
+        if last_start is None:
+            continue
+        dates.extend(chunk_dates[:-1])
+        bodies.extend(chunk_bodies)
+        buf = buf[last_start:]
+        if len(dates) >= batch_size and decide():
+            yield flush()
+
+    chunk_dates, chunk_bodies = split_messages(buf, pattern_info)
+    dates.extend(chunk_dates)
+    bodies.extend(chunk_bodies)
+    if dates:
+        decide(final=True)
+        yield flush()
+
+
+@profiled()
+def preprocess_file(fileobj, chunk_size=CHUNK_SIZE, batch_size=BATCH_SIZE, compact=False, progress=None):
+    """
+    Parse an uploaded export without decoding it into one string. With
+    ``progress``, ``progress(fraction)`` is called with the share of the
+    file read after every batch.
+    """
+    size = None
+    if progress:
+        start = fileobj.tell()
+        size = max(fileobj.seek(0, os.SEEK_END) - start, 1)
+        fileobj.seek(start)
+    batches = []
+    for batch in preprocess_stream(fileobj, chunk_size, batch_size):
+        batches.append(batch)
+        if progress:
+            progress(min((fileobj.tell() - start) / size, 1.0))
+    df = pd.concat(batches) if len(batches) > 1 else batches[0]
+    if compact:
+        df = compact_frame(df)
+    df.attrs['format'] = batches[0].attrs['format']
+    df.attrs['date_format'] = batches[-1].attrs['date_format']
+    _print_summary(df)
+    return df
+
+
+
+PARALLEL_MIN_PIECE = 4 * 1024 * 1024   # characters; smaller inputs are not worth a process
+
+
+def split_at_messages(data, pattern_info, n_pieces):
+    """Cut ``data`` into up to ``n_pieces`` slices that each start at a message header."""
+    regex = pattern_info['regex']
+    bounds = [0]
+    for k in range(1, n_pieces):
+        m = regex.search(data, max(bounds[-1] + 1, len(data) * k // n_pieces))
+        if m is None:
+            break
+        if m.start() > bounds[-1]:
+            bounds.append(m.start())
+    bounds.append(len(data))
+    return [data[a:b] for a, b in zip(bounds, bounds[1:])]
+
+
+def _scan_piece(piece, pattern_name):
+    dates, _, _, _ = _scan(piece, PATTERNS_BY_NAME[pattern_name]['regex'])
+    return _day_strings(dates), len(dates)
+
+
+def _parse_piece(piece, pattern_name, date_format, start):
+    pattern_info = PATTERNS_BY_NAME[pattern_name]
+    dates, bodies = split_messages(piece, pattern_info)
+    return build_frame(dates, bodies, pattern_info['date_formats'], date_format, start)
+
+
+@profiled()
+def preprocess_parallel(data, workers=None, compact=False):
+    """
+    Multi-core ``preprocess`` for very large exports. The text is cut at
+    message boundaries and the pieces are parsed by a process pool, then
+    concatenated in order. A first pool pass collects the day strings of every
+    piece so the date format is decided from the whole file, exactly as in the
+    serial path; the output is identical to ``preprocess(data, compact)``.
+    """
+    workers = workers or os.cpu_count() or 1
+    n_pieces = min(workers, max(1, len(data) // PARALLEL_MIN_PIECE))
+    if n_pieces == 1:
+        return preprocess(data, compact)
+
+    pattern_info = detect_format(data)
+    if pattern_info is None:
+        raise ValueError(FORMAT_ERROR)
+    name = pattern_info['name']
+    print(f"✅ Detected format: {name}")
+
+    pieces = split_at_messages(data, pattern_info, n_pieces)
+    with ProcessPoolExecutor(max_workers=min(workers, len(pieces))) as pool:
+        scanned = list(pool.map(_scan_piece, pieces, [name] * len(pieces)))
+        days = set().union(*(d for d, _ in scanned))
+        date_format, _ = infer_date_format(days, pattern_info['date_formats'])
+        starts, total = [], 0
+        for _, count in scanned:
+            starts.append(total)
+            total += count
+        print(f"📱 Processing {total} messages using {name} format on {len(pieces)} workers")
+        frames = list(pool.map(_parse_piece, pieces, [name] * len(pieces),
+                               [date_format] * len(pieces), starts))
+
+    df = pd.concat(frames)
+    if len(df) < total:
+        print(f"⚠️  Removed {total - len(df)} messages with invalid dates")
+    if compact:
+        df = compact_frame(df)
+    df.attrs['format'] = name
+    df.attrs['date_format'] = date_format
+    _print_summary(df)
     return df
@@ -0,0 +1,184 @@
+"""
+Stage timing for the analysis pipeline.
+
+Pipeline functions are wrapped with ``@profiled`` (or a ``with stage(...)``
+block) and record wall time, row count and resident memory change while a
+run is active on the current thread:
+
+    with profiling.run("Show Analysis") as prof:
+        ...
+    prof.frame()        # one row per stage, nested stages indented
+    prof.to_json()      # for offline comparison between runs
+
+Outside a run the wrappers only cost one thread-local lookup, so they stay
+on in production code. Work done in other processes (job queue, parallel
+preprocessing) is timed as a single stage of the caller.
+"""
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+_local = threading.local()
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def rss_mb():
+    """Resident set size of this process in MB, or None where unavailable."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class Run:
+    """Stages recorded during one run, in the order they started."""
+
+    def __init__(self, label=""):
+        self.label = label
+        self.started = time.time()
+        self.stages = []
+        self._open = []
+        self._t0 = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        record = {
+            "name": name,
+            "parent": self._open[-1]["name"] if self._open else None,
+            "depth": len(self._open),
+            "start": round(time.perf_counter() - self._t0, 4),
+            "seconds": None,
+            "rows": rows,
+            "rss_delta_mb": None,
+        }
+        self.stages.append(record)
+        self._open.append(record)
+        rss = rss_mb()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["seconds"] = round(time.perf_counter() - start, 4)
+            after = rss_mb()
+            if rss is not None and after is not None:
+                record["rss_delta_mb"] = round(after - rss, 2)
+            self._open.pop()
+
+    @property
+    def seconds(self):
+        return round(sum(s["seconds"] or 0.0 for s in self.stages if s["depth"] == 0), 4)
+
+    def frame(self):
+        """Stages as a DataFrame: stage, seconds, rows, rss_delta_mb."""
+        if not self.stages:
+            return pd.DataFrame(columns=["stage", "seconds", "rows", "rss_delta_mb"])
+        df = pd.DataFrame(self.stages)
+        df["stage"] = ["  " * d + n for d, n in zip(df["depth"], df["name"])]
+        return df[["stage", "seconds", "rows", "rss_delta_mb"]]
+
+    def totals(self):
+        """Seconds, calls and rows per stage name, slowest first."""
+        if not self.stages:
+            return pd.DataFrame(columns=["calls", "seconds", "rows"])
+        df = pd.DataFrame(self.stages)
+        df["rows"] = pd.to_numeric(df["rows"])
+        totals = df.groupby("name").agg(calls=("name", "size"), seconds=("seconds", "sum"), rows=("rows", "sum"))
+        return totals.sort_values("seconds", ascending=False)
+
+    def to_dict(self):
+        return {"label": self.label, "started": self.started, "seconds": self.seconds,
+                "pid": os.getpid(), "stages": self.stages}
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.to_dict(), default=str, **kwargs)
+
+
+def current():
+    """The run active on this thread, or None."""
+    return getattr(_local, "run", None)
+
+
+def start_run(label=""):
+    """Start recording on this thread, replacing any unfinished run."""
+    _local.run = Run(label)
+    return _local.run
+
+
+def end_run():
+    """Stop recording on this thread; returns the finished run."""
+    finished, _local.run = current(), None
+    return finished
+
+
+@contextmanager
+def run(label=""):
+    outer = current()
+    prof = start_run(label)
+    try:
+        yield prof
+    finally:
+        _local.run = outer
+
+
+@contextmanager
+def stage(name, rows=None):
+    """Record ``name`` in the active run; yields the record (or None) so rows can be set late."""
+    prof = current()
+    if prof is None:
+        yield None
+        return
+    with prof.stage(name, rows) as record:
+        yield record
+
+
+def _row_count(value):
+    shape = getattr(value, "shape", None)
+    if shape:
+        return int(shape[0])
+    if isinstance(value, list):
+        return len(value)
+    return None
+
+
+def _rows_in(args, kwargs):
+    for value in list(args) + list(kwargs.values()):
+        n = _row_count(value)
+        if n is not None:
+            return n
+    return None
+
+
+def profiled(name=None, rows=None):
+    """
+    Decorator recording calls as a stage named ``name`` (default: module.function).
+    Rows are ``rows(result)`` when given, otherwise the length of the first
+    DataFrame, array or list argument, falling back to the size of the result.
+    """
+    def decorate(fn):
+        label = name or f"{fn.__module__}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            prof = current()
+            if prof is None:
+                return fn(*args, **kwargs)
+            with prof.stage(label, None if rows else _rows_in(args, kwargs)) as record:
+                result = fn(*args, **kwargs)
+                if rows:
+                    record["rows"] = rows(result)
+                elif record["rows"] is None:
+                    record["rows"] = _row_count(result)
+                return result
+        return wrapper
+    return decorate
@@ -1,6 +1,10 @@
 import io
+import hashlib
+import threading
+from collections import OrderedDict
 from datetime import datetime
 import matplotlib.pyplot as plt
+import pandas as pd
 from reportlab.lib.pagesizes import A4
 from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle, Image
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
@@ -11,6 +15,42 @@ from docx import Document
 from docx.shared import Cm
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 
+from profiling import profiled
+
+# Rendered chart PNGs and finished reports, keyed by a hash of their inputs
+# and shared by every ReportGenerator in the process
+PNG_CACHE_ENTRIES = 64
+REPORT_CACHE_ENTRIES = 16
+_png_cache = OrderedDict()
+_report_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+def data_hash(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, (pd.DataFrame, pd.Series)):
+            h.update(pd.util.hash_pandas_object(part, index=True).values.tobytes())
+            h.update(repr(list(part.columns) if isinstance(part, pd.DataFrame) else part.name).encode())
+        elif isinstance(part, dict):
+            h.update(data_hash(*(x for kv in sorted(part.items(), key=lambda kv: str(kv[0])) for x in kv)).encode())
+        else:
+            h.update(repr(part).encode())
+        h.update(b"\x00")
+    return h.hexdigest()
+
+def _cached(cache, limit, key, build):
+    with _cache_lock:
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+            return value
+    value = build()
+    with _cache_lock:
+        cache[key] = value
+        while len(cache) > limit:
+            cache.popitem(last=False)
+    return value
+
 class ReportGenerator:
     def __init__(self):
         self.styles = getSampleStyleSheet()
@@ -46,73 +86,84 @@ class ReportGenerator:
         buf.seek(0)
         return buf
 
-    def generate_pdf_report(self, analysis_data, selected_user, detected_format, charts_data):
-        buf = io.BytesIO()
-        doc = SimpleDocTemplate(buf, pagesize=A4, rightMargin=36, leftMargin=36, topMargin=36, bottomMargin=24)
-        story = []
-        story.append(Paragraph("WhatsApp Chat Analysis Report", self.title_style))
-        story.append(Paragraph(f"Generated on: {datetime.now():%B %d, %Y %I:%M %p}", self.body_style))
-        story.append(Spacer(1,12))
-        story.append(Paragraph("Key Metrics", self.section_style))
-        story.append(self._metric_table(analysis_data, detected_format))
-        story.append(Spacer(1,12))
+    @profiled()
+    def _chart_png(self, name, data, fig_builder):
+        key = data_hash(name, data)
+        png = _cached(_png_cache, PNG_CACHE_ENTRIES, key, lambda: self._chart_image_from_df(fig_builder).getvalue())
+        return io.BytesIO(png)
+
+    def _charts(self, charts_data):
+        """(title, png, width cm, height cm) for every chart in charts_data, shared by PDF and DOCX."""
+        charts = []
 
         # Timeline
         if charts_data.get("timeline") is not None:
-            story.append(Paragraph("Timeline (Monthly)", self.section_style))
             tdf = charts_data["timeline"].copy()
             def _build():
-                import matplotlib.pyplot as plt
                 fig, ax = plt.subplots(figsize=(7.5,4))
                 ax.plot(tdf["time"], tdf["message"], color="green", marker="o", linewidth=2)
                 ax.set_xlabel("Month-Year"); ax.set_ylabel("Messages"); ax.grid(True, alpha=0.3)
                 plt.xticks(rotation=45); plt.tight_layout(); return fig
-            img_buf = self._chart_image_from_df(_build)
-            story.append(Image(img_buf, width=16*cm, height=9*cm))
-            story.append(Spacer(1,10))
+            charts.append(("Timeline (Monthly)", self._chart_png("timeline", tdf, _build), 16, 9))
 
         # Users
         if charts_data.get("user_activity") is not None:
-            story.append(Paragraph("User Activity", self.section_style))
             x = charts_data["user_activity"]
             def _build():
-                import matplotlib.pyplot as plt
                 fig, ax = plt.subplots(figsize=(7.5,4))
                 ax.bar(range(len(x)), x.values, color='skyblue', alpha=0.85)
                 ax.set_xticks(range(len(x))); ax.set_xticklabels(x.index, rotation=45, ha='right')
                 ax.set_xlabel("Users"); ax.set_ylabel("Messages"); ax.grid(True, alpha=0.2); plt.tight_layout(); return fig
-            img_buf = self._chart_image_from_df(_build)
-            story.append(Image(img_buf, width=16*cm, height=9*cm))
-            story.append(Spacer(1,10))
+            charts.append(("User Activity", self._chart_png("user_activity", x, _build), 16, 9))
 
         # Words (HARDENED)
         if charts_data.get("word_analysis") is not None:
-            story.append(Paragraph("Word Frequency", self.section_style))
             wdf = charts_data["word_analysis"].copy().reset_index(drop=True)
             if not wdf.empty and len(wdf.columns) >= 2:
                 wdf = wdf.iloc[:, :2].head(15)
                 wdf.columns = ["word", "count"]
                 def _build():
-                    import matplotlib.pyplot as plt
                     fig, ax = plt.subplots(figsize=(7.5,5))
                     ax.barh(wdf["word"].astype(str), wdf["count"].astype(float), color="steelblue", alpha=0.8)
                     ax.set_xlabel("Frequency"); ax.set_ylabel("Words")
                     ax.grid(True, alpha=0.2); plt.tight_layout(); return fig
-                img_buf = self._chart_image_from_df(_build)
-                story.append(Image(img_buf, width=16*cm, height=10*cm))
-                story.append(Spacer(1,10))
+                charts.append(("Word Frequency", self._chart_png("word_analysis", wdf, _build), 16, 10))
 
         # Emojis
         if charts_data.get("emoji_analysis") is not None:
-            story.append(Paragraph("Emoji Usage", self.section_style))
             edf = charts_data["emoji_analysis"].head(8).copy()
             def _build():
-                import matplotlib.pyplot as plt
                 fig, ax = plt.subplots(figsize=(6.5,6))
                 ax.pie(edf.iloc[:,1], labels=edf.iloc[:,0], autopct='%1.1f%%', startangle=90)
                 ax.set_title("Top Emojis"); plt.tight_layout(); return fig
-            img_buf = self._chart_image_from_df(_build)
-            story.append(Image(img_buf, width=12*cm, height=12*cm))
+            charts.append(("Emoji Usage", self._chart_png("emoji_analysis", edf, _build), 12, 12))
+
+        return charts
+
+    def _report_key(self, kind, analysis_data, selected_user, detected_format, charts_data):
+        return data_hash(kind, analysis_data, selected_user, detected_format, charts_data)
+
+    def generate_pdf_report(self, analysis_data, selected_user, detected_format, charts_data):
+        key = self._report_key("pdf", analysis_data, selected_user, detected_format, charts_data)
+        pdf = _cached(_report_cache, REPORT_CACHE_ENTRIES, key,
+                      lambda: self._build_pdf(analysis_data, detected_format, charts_data))
+        return io.BytesIO(pdf)
+
+    @profiled()
+    def _build_pdf(self, analysis_data, detected_format, charts_data):
+        buf = io.BytesIO()
+        doc = SimpleDocTemplate(buf, pagesize=A4, rightMargin=36, leftMargin=36, topMargin=36, bottomMargin=24)
+        story = []
+        story.append(Paragraph("WhatsApp Chat Analysis Report", self.title_style))
+        story.append(Paragraph(f"Generated on: {datetime.now():%B %d, %Y %I:%M %p}", self.body_style))
+        story.append(Spacer(1,12))
+        story.append(Paragraph("Key Metrics", self.section_style))
+        story.append(self._metric_table(analysis_data, detected_format))
+        story.append(Spacer(1,12))
+
+        for title, img_buf, width, height in self._charts(charts_data):
+            story.append(Paragraph(title, self.section_style))
+            story.append(Image(img_buf, width=width*cm, height=height*cm))
             story.append(Spacer(1,10))
 
         # AI summary
@@ -121,10 +172,16 @@ class ReportGenerator:
             story.append(Paragraph(analysis_data["ai_summary"].replace("**","").replace("🤖",""), self.body_style))
 
         doc.build(story)
-        buf.seek(0)
-        return buf
+        return buf.getvalue()
 
     def generate_docx_report(self, analysis_data, selected_user, detected_format, charts_data):
+        key = self._report_key("docx", analysis_data, selected_user, detected_format, charts_data)
+        docx = _cached(_report_cache, REPORT_CACHE_ENTRIES, key,
+                       lambda: self._build_docx(analysis_data, detected_format, charts_data))
+        return io.BytesIO(docx)
+
+    @profiled()
+    def _build_docx(self, analysis_data, detected_format, charts_data):
         buf = io.BytesIO()
         doc = Document()
 
@@ -161,6 +218,12 @@ class ReportGenerator:
 
         doc.add_paragraph("")
 
+        # Charts, the same images as the PDF
+        for title, img_buf, width, _ in self._charts(charts_data):
+            doc.add_paragraph(title).runs[0].bold = True
+            doc.add_picture(img_buf, width=Cm(width))
+            doc.add_paragraph("")
+
         # Word Analysis (optional)
         wdf = charts_data.get("word_analysis")
         if wdf is not None and not wdf.empty and len(wdf.columns) >= 2:
@@ -183,5 +246,4 @@ class ReportGenerator:
             doc.add_paragraph(str(analysis_data["ai_summary"]).replace("**",""))
 
         doc.save(buf)
-        buf.seek(0)
-        return buf
+        return buf.getvalue()
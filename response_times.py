@@ -0,0 +1,97 @@
+"""
+Response latencies and conversation sessions for a whole chat.
+
+A reply is a message whose sender differs from the sender of the message
+before it; its latency is the time since that message. A session is a run
+of messages without a gap longer than the inactivity threshold. Everything
+is computed with shifted columns over the chat once, then sliced per user.
+"""
+import numpy as np
+import pandas as pd
+
+import frame_cache
+from profiling import profiled
+
+SESSION_GAP_MINUTES = 30
+PERCENTILES = (25, 50, 75, 90, 95)
+
+
+class ResponseTimes:
+    """Replies (responder, replied-to sender, minutes) and sessions of a chat."""
+
+    def __init__(self, df, session_gap=SESSION_GAP_MINUTES):
+        self.session_gap = session_gap
+        chat = df.loc[df["user"] != "group_notification", ["date", "user"]]
+        chat = chat.sort_values("date", kind="stable")
+        users = chat["user"].astype(str).to_numpy()
+        ns = chat["date"].to_numpy("datetime64[ns]").view("int64")
+        gaps = np.diff(ns) / 60e9   # minutes since the previous message
+
+        reply = users[1:] != users[:-1]
+        self.replies = pd.DataFrame({
+            "responder": users[1:][reply],
+            "to": users[:-1][reply],
+            "minutes": gaps[reply],
+        })
+
+        session = np.concatenate([[0], np.cumsum(gaps > session_gap)]) if len(users) else np.empty(0, dtype=np.int64)
+        messages = pd.DataFrame({"session": session, "user": users, "ns": ns})
+        per = messages.groupby("session")
+        self.sessions = pd.DataFrame({
+            "start": pd.to_datetime(per["ns"].first()),
+            "end": pd.to_datetime(per["ns"].last()),
+            "messages": per.size(),
+            "participants": per["user"].nunique(),
+            "starter": per["user"].first(),
+        })
+        self.sessions["minutes"] = (self.sessions["end"] - self.sessions["start"]).dt.total_seconds() / 60.0
+        self.members = messages[["session", "user"]].drop_duplicates()
+
+    def minutes(self, selected_user="Overall"):
+        """Latencies of every reply, or of the replies sent by one user."""
+        if selected_user == "Overall":
+            return self.replies["minutes"]
+        return self.replies.loc[self.replies["responder"] == selected_user, "minutes"]
+
+    def stats(self, selected_user="Overall"):
+        m = self.minutes(selected_user).to_numpy()
+        if not len(m):
+            return {}
+        return {
+            "avg_response_time": float(np.mean(m)),
+            "response_time_std": float(np.std(m)),
+            "median_response_time": float(np.median(m)),
+            "response_time_percentiles": {f"p{q}": float(v) for q, v in zip(PERCENTILES, np.percentile(m, PERCENTILES))},
+            "replies": int(len(m)),
+        }
+
+    def latency_matrix(self, selected_user="Overall", agg="median"):
+        """Reply latency in minutes, responder (rows) by the sender replied to (columns)."""
+        replies = self.replies
+        if selected_user != "Overall":
+            replies = replies[replies["responder"] == selected_user]
+        if replies.empty:
+            return pd.DataFrame()
+        return replies.pivot_table(index="responder", columns="to", values="minutes", aggfunc=agg)
+
+    def session_stats(self, selected_user="Overall"):
+        sessions = self.sessions
+        if selected_user != "Overall":
+            joined = self.members.loc[self.members["user"] == selected_user, "session"]
+            sessions = sessions.loc[sessions.index.isin(joined)]
+        if sessions.empty:
+            return {}
+        out = {
+            "sessions": int(len(sessions)),
+            "avg_session_minutes": float(sessions["minutes"].mean()),
+            "avg_session_messages": float(sessions["messages"].mean()),
+        }
+        if selected_user != "Overall":
+            out["sessions_started"] = int((sessions["starter"] == selected_user).sum())
+        return out
+
+
+@profiled()
+def response_times(df, session_gap=SESSION_GAP_MINUTES):
+    """Response latencies and sessions of a chat frame, built once per frame."""
+    return frame_cache.derived(df, f"response_times_{session_gap}", lambda d: ResponseTimes(d, session_gap))
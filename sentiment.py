@@ -0,0 +1,88 @@
+"""
+Batched TextBlob sentiment scoring for whole chats.
+
+Polarity is computed once per distinct message text (chats repeat "ok" and
+"haha" endlessly), large batches of new texts are spread over a process pool,
+and the per-message scores are stored on the chat frame as a ``sentiment``
+column so daily and per-user views reuse them.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from textblob import TextBlob
+
+import frame_cache
+from preprocessor import TEXT_SKIP_RE
+from profiling import profiled
+
+BATCH_SIZE = 5_000
+PARALLEL_MIN_TEXTS = 20_000   # fewer new texts than this are scored in-process
+MEMO_LIMIT = 500_000
+
+_memo = {}
+
+
+def _polarity(text):
+    try:
+        return TextBlob(text).sentiment.polarity  # [-1, 1]
+    except Exception:
+        return 0.0
+
+
+def polarity_batch(texts):
+    return [_polarity(t) for t in texts]
+
+
+def score_texts(texts, workers=None, progress=None):
+    """
+    Polarity for each distinct text in ``texts``, as a dict. ``progress`` is
+    called with the fraction of new texts scored so far.
+    """
+    polarity, todo = {}, []
+    for t in dict.fromkeys(texts):
+        score = _memo.get(t)
+        if score is None:
+            todo.append(t)
+        else:
+            polarity[t] = score
+    if todo:
+        batches = [todo[i:i + BATCH_SIZE] for i in range(0, len(todo), BATCH_SIZE)]
+        workers = workers or os.cpu_count() or 1
+        if len(todo) >= PARALLEL_MIN_TEXTS and workers > 1:
+            with ProcessPoolExecutor(max_workers=min(workers, len(batches))) as pool:
+                results = []
+                for scores in pool.map(polarity_batch, batches):
+                    results.append(scores)
+                    if progress: progress(len(results) / len(batches))
+        else:
+            results = []
+            for b in batches:
+                results.append(polarity_batch(b))
+                if progress: progress(len(results) / len(batches))
+        fresh = {}
+        for batch, scores in zip(batches, results):
+            fresh.update(zip(batch, scores))
+        if len(_memo) + len(fresh) > MEMO_LIMIT:
+            _memo.clear()
+        _memo.update(fresh)
+        polarity.update(fresh)
+    return polarity
+
+
+@profiled()
+def score_messages(df, workers=None, progress=None):
+    """Per-message polarity aligned with ``df``; NaN for skipped messages."""
+    messages = df['message'].astype(str)
+    scored = ~messages.str.contains(TEXT_SKIP_RE, na=False)
+    scores = np.full(len(df), np.nan)
+    if scored.any():
+        polarity = score_texts(pd.unique(messages[scored]), workers, progress)
+        scores[scored.to_numpy()] = messages[scored].map(polarity).to_numpy(dtype=float)
+    return pd.Series(scores, index=df.index, name='sentiment')
+
+
+def message_sentiment(df, workers=None):
+    """Per-message polarity of a chat frame, scored on first use and kept in frame_cache."""
+    return frame_cache.derived(df, 'sentiment', lambda d: score_messages(d, workers))
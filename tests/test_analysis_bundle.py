@@ -0,0 +1,29 @@
+import gc
+
+import pandas as pd
+
+from analysis_bundle import BundleCache
+
+
+def frame():
+    return pd.DataFrame({'user': ['Alice', 'Bob'], 'message': ['hi', 'hello']})
+
+
+def test_bundle_is_reused_for_the_same_frame():
+    cache = BundleCache()
+    df = frame()
+    bundle = cache.get("chat", "Overall", df)
+    assert cache.get("chat", "Overall", df) is bundle
+    assert bundle.df is df
+
+
+def test_cached_bundles_do_not_keep_frames_alive():
+    cache = BundleCache()
+    df = frame()
+    bundle = cache.get("chat", "Overall", df)
+    del df
+    gc.collect()
+    assert bundle.df is None
+
+    cache.get("other", "Overall", frame())
+    assert list(cache._bundles) == [("other", "Overall")]
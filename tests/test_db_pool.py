@@ -0,0 +1,97 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from db_pool import ConnectionPool, PoolTimeout
+
+
+def sqlite_pool(path=":memory:", **kwargs):
+    def connect():
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.create_function("sleep", 1, time.sleep)
+        return conn
+    return ConnectionPool(connect, **kwargs)
+
+
+def test_connections_are_reused():
+    pool = sqlite_pool()
+    first = pool.acquire()
+    pool.release(first)
+    assert pool.acquire() is first
+    assert pool.stats()["created"] == 1
+
+
+def test_warm_opens_min_size_connections():
+    pool = sqlite_pool(min_size=3)
+    pool.warm()
+    stats = pool.stats()
+    assert (stats["size"], stats["idle"], stats["created"]) == (3, 3, 3)
+
+
+def test_acquire_times_out_when_exhausted():
+    pool = sqlite_pool(max_size=1)
+    pool.acquire()
+    with pytest.raises(PoolTimeout):
+        pool.acquire(timeout=0.05)
+    assert pool.stats()["timeouts"] == 1
+
+
+def test_waiting_acquire_gets_released_connection():
+    pool = sqlite_pool(max_size=1)
+    conn = pool.acquire()
+    threading.Timer(0.05, pool.release, args=(conn,)).start()
+    assert pool.acquire(timeout=2) is conn
+
+
+def test_dead_connection_is_replaced():
+    pool = sqlite_pool(health_check_interval=0)
+    conn = pool.acquire()
+    pool.release(conn)
+    conn.close()
+    fresh = pool.acquire()
+    assert fresh is not conn
+    assert pool.stats()["failed_checks"] == 1
+
+
+def test_connection_commits_and_rolls_back(tmp_path):
+    pool = sqlite_pool(str(tmp_path / "pool.db"))
+    with pool.connection() as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+        conn.execute("INSERT INTO t VALUES (1)")
+    with pytest.raises(RuntimeError):
+        with pool.connection() as conn:
+            conn.execute("INSERT INTO t VALUES (2)")
+            raise RuntimeError("boom")
+    check = sqlite3.connect(str(tmp_path / "pool.db"))
+    assert check.execute("SELECT x FROM t").fetchall() == [(1,)]
+    assert pool.stats()["in_use"] == 0
+
+
+def test_health_ping_does_not_block_other_acquirers():
+    pool = sqlite_pool(max_size=2, health_check_interval=0, ping="SELECT sleep(0.5)")
+    pool.release(pool.acquire())
+    pinging = threading.Thread(target=pool.acquire)
+    pinging.start()
+    time.sleep(0.1)   # the idle connection is now being pinged
+    start = time.monotonic()
+    pool.acquire(timeout=2)
+    assert time.monotonic() - start < 0.3
+    pinging.join()
+
+
+def test_health_check_and_stats():
+    pool = sqlite_pool()
+    assert pool.health_check()["ok"]
+    stats = pool.stats()
+    assert stats["in_use"] == 0 and stats["idle"] == 1
+
+
+def test_health_check_gives_up_quickly_when_exhausted():
+    pool = sqlite_pool(max_size=1, timeout=30)
+    pool.acquire()
+    start = time.monotonic()
+    health = pool.health_check(timeout=0.05)
+    assert not health["ok"] and health["error"]
+    assert time.monotonic() - start < 1
@@ -0,0 +1,126 @@
+import contextlib
+import io
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import chat_cache
+import frame_cache
+import helper
+import incremental
+import preprocessor
+from emoji_extractor import EmojiCounts
+from sentiment import message_sentiment, score_messages
+from topics import TOPICS_KEY, chat_documents, chat_topics
+
+MESSAGES = [
+    "good morning everyone, the weather looks lovely today 😀",
+    "<Media omitted>",
+    "did anyone watch the football match last night? great game 👍🏽",
+    "This message was deleted",
+    "meeting moved to friday afternoon, please bring the project report",
+    "check https://example.com/notes before the meeting",
+    "terrible traffic again, I will be late 😂😂",
+    "multi line message\ncontinues on the next line",
+]
+
+
+def chat(first, last, users):
+    """Android export lines of messages ``first`` to ``last``, 47 minutes apart."""
+    start = datetime(2024, 1, 1, 8, 0)
+    lines = []
+    for i in range(first, last):
+        t = start + timedelta(minutes=47 * i)
+        lines.append(f"{t:%d/%m/%y}, {t:%H:%M} - {users[i % len(users)]}: {MESSAGES[i % len(MESSAGES)]}")
+    return '\n'.join(lines) + '\n'
+
+
+def quiet(fn, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args, **kwargs)
+
+
+def export_pair():
+    """An export and its re-export, which adds messages and a new user."""
+    old = chat(0, 600, ("Alice", "Bob Smith", "+91 98765 43210"))
+    return old, old + chat(600, 750, ("Alice", "Chandra"))
+
+
+def warm(df):
+    """Build every aggregate extend() knows how to merge."""
+    helper.activity_cube(df)
+    helper.token_stats(df)
+    frame_cache.derived(df, 'emoji_counts', EmojiCounts)
+    message_sentiment(df, workers=1)
+    chat_topics(df)
+
+
+def str_index(series):
+    series = series.copy()
+    series.index = series.index.astype(str)
+    return series.sort_index()
+
+
+def cube_counts(cube):
+    counts = cube.counts.rename('count').reset_index().astype({'user': str})
+    return counts.set_index(['user', 'only_date', 'hour'])['count'].sort_index()
+
+
+def test_extend_equals_a_full_parse():
+    old, new = export_pair()
+    base = quiet(preprocessor.preprocess, old, compact=True)
+    warm(base)
+    merged = quiet(incremental.extend, base, new[len(old):])
+    full = quiet(preprocessor.preprocess, new, compact=True)
+
+    # Rows are numbered on from the base frame, as in a full parse
+    pd.testing.assert_frame_equal(merged, full, check_categorical=False)
+    assert merged.attrs == full.attrs
+
+    derived = frame_cache.entries(merged)
+    cube, expected_cube = derived['activity_cube'], helper.ActivityCube(full)
+    pd.testing.assert_series_equal(cube_counts(cube), cube_counts(expected_cube), check_dtype=False)
+    pd.testing.assert_frame_equal(cube.slice('Overall'), expected_cube.slice('Overall'), check_dtype=False)
+
+    tokens, expected_tokens = derived['token_stats'], helper.TokenStats(full)
+    pd.testing.assert_series_equal(str_index(tokens.word_totals), str_index(expected_tokens.word_totals),
+                                   check_dtype=False, check_names=False)
+    pd.testing.assert_series_equal(str_index(tokens.message_counts), str_index(expected_tokens.message_counts),
+                                   check_dtype=False, check_names=False)
+    assert tokens.overall == expected_tokens.overall
+    assert {str(u): c for u, c in tokens.by_user.items()} == {str(u): c for u, c in expected_tokens.by_user.items()}
+
+    emojis, expected_emojis = derived['emoji_counts'], EmojiCounts(full)
+    assert emojis.overall == expected_emojis.overall
+    assert {str(u): c for u, c in emojis.by_user.items()} == {str(u): c for u, c in expected_emojis.by_user.items()}
+
+    pd.testing.assert_series_equal(derived['sentiment'], score_messages(full))
+
+    # The topic model learned the new documents, under their row positions
+    model, base_model = derived[TOPICS_KEY], frame_cache.entries(base)[TOPICS_KEY]
+    _, rows = chat_documents(full)
+    np.testing.assert_array_equal(model.rows, rows)
+    assert model.dist.shape == (len(rows), model.lda.n_components)
+    assert len(base_model.rows) < len(rows)
+
+
+def test_get_or_parse_serves_a_re_export_from_the_earlier_one():
+    old, new = (text.encode('utf-8') for text in export_pair())
+    cache, index = chat_cache.ChatCache(), incremental.PrefixIndex()
+
+    def parse(data):
+        return lambda: quiet(preprocessor.preprocess_file, io.BytesIO(data), compact=True)
+
+    base = incremental.get_or_parse(cache, index, io.BytesIO(old), chat_cache.content_hash(old), parse(old))
+    warm(base)
+
+    def fail():
+        raise AssertionError("the re-export should not be parsed in full")
+
+    upload = io.BytesIO(new)
+    merged = quiet(incremental.get_or_parse, cache, index, upload, chat_cache.content_hash(new), fail)
+    assert upload.tell() == 0
+    pd.testing.assert_frame_equal(merged, quiet(preprocessor.preprocess, new.decode('utf-8'), compact=True),
+                                  check_categorical=False)
+    assert cache.get(chat_cache.content_hash(new)) is merged
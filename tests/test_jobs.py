@@ -0,0 +1,71 @@
+import contextlib
+import io
+import os
+import time
+
+import pandas as pd
+
+import jobs
+import preprocessor
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def android_frame():
+    with open(os.path.join(FIXTURES, 'android_chat.txt'), encoding='utf-8') as f:
+        data = f.read()
+    with contextlib.redirect_stdout(io.StringIO()):
+        return preprocessor.preprocess(data)
+
+
+def wait(queue, job_id, timeout=120):
+    deadline = time.monotonic() + timeout
+    while queue.status(job_id)['state'] not in (jobs.DONE, jobs.FAILED):
+        assert time.monotonic() < deadline, "job did not finish"
+        time.sleep(0.1)
+    return queue.status(job_id)
+
+
+def test_dead_worker_does_not_break_later_jobs():
+    queue = jobs.JobQueue(workers=1)
+    df = android_frame()
+    try:
+        first = queue.submit("chat", "sentiment", df)
+        for process in list(queue._pool._processes.values()):
+            process.kill()
+        assert wait(queue, first)['state'] == jobs.FAILED
+
+        # The failed job is resubmitted, on a fresh pool
+        second = queue.submit("chat", "sentiment", df)
+        assert second != first
+        assert wait(queue, second)['state'] == jobs.DONE
+        assert len(queue.result(second)) == len(df)
+    finally:
+        queue.shutdown()
+
+
+def test_preprocess_job_parses_the_spooled_upload(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "SPOOL_DIR", str(tmp_path))
+    with open(os.path.join(FIXTURES, 'android_chat.txt'), 'rb') as f:
+        upload = io.BytesIO(f.read())
+    upload.seek(5)
+    path = jobs.spool(upload, "chat")
+    assert upload.tell() == 5
+
+    queue = jobs.JobQueue(workers=1)
+    try:
+        job_id = queue.submit("chat", "preprocess", path)
+        assert wait(queue, job_id)['state'] == jobs.DONE
+        df = queue.result(job_id)
+        queue.forget(job_id)
+        assert queue.find("chat", "preprocess") is None
+    finally:
+        queue.shutdown()
+    jobs.unspool("chat")
+    assert not os.path.exists(path)
+
+    upload.seek(0)
+    with contextlib.redirect_stdout(io.StringIO()):
+        expected = preprocessor.preprocess_file(upload, compact=True)
+    pd.testing.assert_frame_equal(df, expected)
+    assert df.attrs == expected.attrs
@@ -0,0 +1,93 @@
+import contextlib
+import io
+import os
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+import preprocessor
+
+
+def quiet(fn, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args, **kwargs)
+
+
+def dated_chat(n_messages, month_first):
+    """Android export, oldest first from January 1st, so early days are ambiguous."""
+    start = datetime(2023, 1, 1, 8, 0)
+    lines = []
+    for i in range(n_messages):
+        t = start + timedelta(minutes=5 * i)
+        day = f"{t.month}/{t.day}/{t:%y}" if month_first else f"{t.day}/{t.month}/{t:%y}"
+        text = f"message {i}\nsecond line" if i % 7 == 0 else f"message {i}"
+        lines.append(f"{day}, {t:%H:%M} - User {i % 4}: {text}")
+    return '\n'.join(lines) + '\n'
+
+
+def us_chat(n_messages):
+    """Android export with month-first dates."""
+    return dated_chat(n_messages, month_first=True)
+
+
+def test_preprocess_file_matches_preprocess_on_month_first_export():
+    data = us_chat(20_000)
+    expected = quiet(preprocessor.preprocess, data)
+    streamed = quiet(preprocessor.preprocess_file, io.BytesIO(data.encode('utf-8')),
+                     chunk_size=8192, batch_size=500)
+    assert expected.attrs['date_format'].startswith('%m')
+    pd.testing.assert_frame_equal(streamed, expected)
+
+
+@pytest.mark.parametrize('month_first', [False, True])
+def test_preprocess_parallel_matches_preprocess(monkeypatch, month_first):
+    data = dated_chat(20_000, month_first)
+    monkeypatch.setattr(preprocessor, 'PARALLEL_MIN_PIECE', len(data) // 8)
+    expected = quiet(preprocessor.preprocess, data, compact=True)
+    parallel = quiet(preprocessor.preprocess_parallel, data, workers=4, compact=True)
+    assert expected.attrs['date_format'].startswith('%m' if month_first else '%d')
+    pd.testing.assert_frame_equal(parallel, expected)
+    assert parallel.attrs == expected.attrs
+
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def fixture_chat(name):
+    with open(os.path.join(FIXTURES, name), encoding='utf-8') as f:
+        return f.read()
+
+
+def users_and_messages(df):
+    return df[['user', 'message']].reset_index(drop=True).astype(object)
+
+
+# Expected values are what the per-message loop used before extract_users was vectorized
+def test_extract_users_android():
+    df = quiet(preprocessor.preprocess, fixture_chat('android_chat.txt'))
+    expected = pd.DataFrame([
+        ('group_notification', 'Messages and calls are end-to-end encrypted. No one outside of this chat can read them.'),
+        ('group_notification', 'Priya created group "Trip"'),
+        ('Priya', 'Hi all'),
+        ('Rahul', 'hello'),
+        ('+91 98765 43210', 'Packing list:\n- tent\n- stove'),
+        ('group_notification', 'Rahul: <Media omitted>'),
+        ('group_notification', 'Rahul left'),
+        ('Priya', 'see https://example.com: ok'),
+        ('Priya', '<Empty message>'),
+    ], columns=['user', 'message'], dtype=object)
+    pd.testing.assert_frame_equal(users_and_messages(df), expected)
+
+
+def test_extract_users_ios():
+    df = quiet(preprocessor.preprocess, fixture_chat('ios_chat.txt'))
+    expected = pd.DataFrame([
+        ('group_notification', 'Trip: Messages and calls are end-to-end encrypted.'),
+        ('Anna Lee', 'Good morning'),
+        ('Ben', 'Line one\nline two'),
+        ('group_notification', 'Anna Lee: image omitted'),
+        ('Ben', 'ok: sure'),
+        ('group_notification', 'Security code changed'),
+    ], columns=['user', 'message'], dtype=object)
+    pd.testing.assert_frame_equal(users_and_messages(df), expected)
@@ -0,0 +1,55 @@
+import pandas as pd
+
+from response_times import ResponseTimes
+
+
+def chat(*messages):
+    return pd.DataFrame([(pd.Timestamp(f"2024-03-01 {t}"), user) for t, user in messages], columns=['date', 'user'])
+
+
+# Replies, by hand: B->A 5, A->B 13, C->A 70, A->C 2, B->A 8 minutes.
+# The notification at 09:10 is neither a reply nor replied to.
+CHAT = chat(
+    ("09:00", "Alice"),
+    ("09:05", "Bob"),
+    ("09:07", "Bob"),
+    ("09:10", "group_notification"),
+    ("09:20", "Alice"),
+    ("10:30", "Chandra"),   # more than 30 minutes later: a new session
+    ("10:32", "Alice"),
+    ("10:40", "Bob"),
+)
+
+
+def test_latency_matrix():
+    matrix = ResponseTimes(CHAT).latency_matrix()
+    expected = pd.DataFrame(
+        {"Alice": [None, 6.5, 70.0], "Bob": [13.0, None, None], "Chandra": [2.0, None, None]},
+        index=pd.Index(["Alice", "Bob", "Chandra"], name="responder"),
+    )
+    expected.columns.name = "to"
+    pd.testing.assert_frame_equal(matrix, expected)
+    assert ResponseTimes(CHAT).latency_matrix("Bob").to_dict("index") == {"Bob": {"Alice": 6.5}}
+
+
+def test_reply_minutes_exclude_group_notifications():
+    times = ResponseTimes(CHAT)
+    assert times.minutes().tolist() == [5.0, 13.0, 70.0, 2.0, 8.0]
+    assert times.minutes("Alice").tolist() == [13.0, 2.0]
+    assert "group_notification" not in set(times.replies["responder"]) | set(times.replies["to"])
+    assert times.stats("Bob")["median_response_time"] == 6.5
+
+
+def test_sessions_split_on_inactivity():
+    times = ResponseTimes(CHAT)
+    sessions = times.sessions
+    assert sessions["messages"].tolist() == [4, 3]
+    assert sessions["minutes"].tolist() == [20.0, 10.0]
+    assert sessions["starter"].tolist() == ["Alice", "Chandra"]
+    assert sessions["participants"].tolist() == [2, 3]
+    assert times.session_stats("Chandra") == {
+        "sessions": 1, "avg_session_minutes": 10.0, "avg_session_messages": 3.0, "sessions_started": 1,
+    }
+    assert times.session_stats("Bob")["sessions_started"] == 0
+    # A longer threshold keeps the whole morning in one session
+    assert len(ResponseTimes(CHAT, session_gap=90).sessions) == 1
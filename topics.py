@@ -0,0 +1,166 @@
+"""
+Topic model for a whole chat.
+
+The TF-IDF document-term matrix is built once per chat and LDA is trained
+online (``partial_fit`` over mini-batches), so large chats are streamed
+through the model and newly appended messages can be folded in with
+``update`` instead of refitting. One model with N_TOPICS topics is fitted
+per chat; per-user topics come from the rows of the cached matrix that
+belong to the user, and callers asking for fewer topics get the strongest.
+"""
+import re
+
+import numpy as np
+from scipy.sparse import vstack
+from sklearn.decomposition import LatentDirichletAllocation
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+import frame_cache
+from preprocessor import TEXT_SKIP_RE
+from profiling import profiled
+
+N_TOPICS = 5
+MAX_FEATURES = 2000
+TOPICS_KEY = "topics"   # frame_cache entry of a chat's model
+BATCH_SIZE = 1024
+PASSES = 10
+MIN_DOCS = 10
+MIN_TEXT_LENGTH = 10
+TOP_WORDS = 10
+
+_PUNCT_RE = re.compile(r"[^\w\s]")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def clean_text(message):
+    t = _PUNCT_RE.sub(" ", str(message).lower())
+    return _SPACE_RE.sub(" ", t).strip()
+
+
+@profiled()
+def chat_documents(df, start=0):
+    """Cleaned texts long enough to model, with their row positions in ``df``."""
+    messages = df["message"].astype(str)
+    keep = ~messages.str.contains(TEXT_SKIP_RE, na=False).to_numpy()
+    texts, rows = [], []
+    for pos in np.flatnonzero(keep):
+        t = clean_text(messages.iat[pos])
+        if len(t) > MIN_TEXT_LENGTH:
+            texts.append(t)
+            rows.append(start + pos)
+    return texts, np.asarray(rows, dtype=np.int64)
+
+
+class TopicModel:
+    """
+    Online LDA over a TF-IDF matrix with a fixed vocabulary.
+
+    ``fit`` learns the vocabulary and trains the topics over mini-batches;
+    ``update`` adds new documents with the same vocabulary and continues
+    training. ``X`` and ``dist`` keep one row per document, ``rows`` maps
+    them back to row positions in the chat frame.
+    """
+
+    def __init__(self, n_topics=N_TOPICS, max_features=MAX_FEATURES, batch_size=BATCH_SIZE,
+                 passes=PASSES, random_state=42):
+        self.n_topics = n_topics
+        self.batch_size = batch_size
+        self.passes = passes
+        self.random_state = random_state
+        self.vectorizer = TfidfVectorizer(max_features=max_features, stop_words="english", ngram_range=(1, 2))
+        self.lda = None
+        self.X = None
+        self.dist = None
+        self.rows = np.empty(0, dtype=np.int64)
+
+    @property
+    def fitted(self):
+        return self.lda is not None
+
+    def _train(self, X, progress=None):
+        for n in range(self.passes):
+            for i in range(0, X.shape[0], self.batch_size):
+                self.lda.partial_fit(X[i:i + self.batch_size])
+            if progress: progress((n + 1) / self.passes)
+
+    @profiled()
+    def fit(self, texts, rows=None, progress=None):
+        if len(texts) < MIN_DOCS:
+            return self
+        X = self.vectorizer.fit_transform(texts)
+        self.lda = LatentDirichletAllocation(
+            n_components=max(1, min(self.n_topics, X.shape[0])),
+            learning_method="online", batch_size=self.batch_size,
+            total_samples=X.shape[0], random_state=self.random_state,
+        )
+        self._train(X, progress)
+        self.X = X
+        self.dist = self.lda.transform(X)
+        self.rows = np.arange(len(texts)) if rows is None else np.asarray(rows, dtype=np.int64)
+        return self
+
+    @profiled()
+    def update(self, texts, rows=None):
+        """Fold newly appended documents into the model."""
+        if not texts:
+            return self
+        if not self.fitted:
+            return self.fit(texts, rows)
+        if rows is None:
+            start = int(self.rows[-1]) + 1 if len(self.rows) else 0
+            rows = np.arange(start, start + len(texts))
+        X_new = self.vectorizer.transform(texts)
+        self.lda.total_samples = self.X.shape[0] + X_new.shape[0]
+        for i in range(0, X_new.shape[0], self.batch_size):
+            self.lda.partial_fit(X_new[i:i + self.batch_size])
+        # Earlier documents keep the distribution they were given
+        self.X = vstack([self.X, X_new], format="csr")
+        self.dist = np.vstack([self.dist, self.lda.transform(X_new)])
+        self.rows = np.concatenate([self.rows, np.asarray(rows, dtype=np.int64)])
+        return self
+
+    def topics(self, rows=None, n_topics=None, n_words=TOP_WORDS):
+        """
+        Top words of the ``n_topics`` strongest topics and the matching
+        document-topic columns, either for the whole chat or for the
+        documents at ``rows`` (a user's messages). Returns ``(None, None)``
+        when there is too little text.
+        """
+        if not self.fitted:
+            return None, None
+        vocab = self.vectorizer.get_feature_names_out()
+        n_topics = min(n_topics or self.n_topics, self.lda.n_components)
+
+        if rows is None:
+            order = self.dist.sum(axis=0).argsort()[::-1][:n_topics]
+            weights = self.lda.components_[order]
+            return [[vocab[i] for i in w.argsort()[-n_words:][::-1]] for w in weights], self.dist[:, order]
+
+        mask = np.isin(self.rows, rows)
+        if mask.sum() < MIN_DOCS:
+            return None, None
+        dist, X = self.dist[mask], self.X[mask]
+        # The user's strongest topics, with words weighted by how much of the
+        # user's own text each topic explains
+        order = dist.sum(axis=0).argsort()[::-1][:n_topics]
+        phi = self.lda.components_ / self.lda.components_.sum(axis=1, keepdims=True)
+        topics = []
+        for k in order:
+            scores = np.asarray(X.T @ dist[:, k]).ravel() * phi[k]
+            top = [i for i in scores.argsort()[-n_words:][::-1] if scores[i] > 0]
+            topics.append([vocab[i] for i in top])
+        return topics, dist[:, order]
+
+
+def fit_chat_topics(df, progress=None):
+    texts, rows = chat_documents(df)
+    try:
+        return TopicModel().fit(texts, rows, progress)
+    except ValueError:
+        # Nothing left after stop words
+        return TopicModel()
+
+
+def chat_topics(df):
+    """The topic model of a chat frame, fitted once per frame."""
+    return frame_cache.derived(df, TOPICS_KEY, fit_chat_topics)